@@ -0,0 +1,246 @@
+"""Offline micro-benchmarks for the cogs and the storage layer.
+
+Drives the Economy and Games cogs and ``on_message`` through stand-ins for
+discord.py's Context and Message against a temporary SQLite file, then prints
+throughput, p50/p99 latency and SQL statements per command. Run it from the
+repository root, so ``thingv2`` can be imported::
+
+    python -m benchmarks.bench_cogs [--iterations 500] [--write-behind] [--memory]
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from sqlalchemy import event
+
+from thingv2.index import create_bot
+
+ids = itertools.count(10**17)
+
+
+class FakeUser:
+    def __init__(self):
+        self.id = next(ids)
+        self.name = "user{}".format(self.id)
+        self.discriminator = "0001"
+
+
+class FakeEmbed:
+    def __init__(self, colour):
+        self.colour = colour
+
+
+class FakeMessage:
+    def __init__(self, channel, author=None, embed=None, guild=None):
+        self.id = next(ids)
+        self.channel = channel
+        self.guild = guild
+        self.author = author
+        self.content = ""
+        self.embeds = [embed] if embed else []
+
+    async def edit(self, embed=None):
+        self.embeds = [embed]
+
+    async def delete(self):
+        pass
+
+
+class FakeChannel:
+    def __init__(self):
+        self.id = next(ids)
+        self.messages: Dict[int, FakeMessage] = {}
+
+    async def send(self, embed=None):
+        message = FakeMessage(self, embed=embed)
+        self.messages[message.id] = message
+        return message
+
+
+class FakeGuild:
+    def __init__(self):
+        self.id = next(ids)
+
+
+class FakeContext:
+    def __init__(self, bot, author, guild, channel):
+        self.bot = bot
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+        self.message = FakeMessage(channel, author)
+
+    async def send(self, embed=None):
+        return await self.channel.send(embed=embed)
+
+    async def fetch_message(self, message_id):
+        return self.channel.messages[message_id]
+
+
+class StatementCounter:
+    def __init__(self, database):
+        self.count = 0
+        for partition in database.partitions:
+            event.listen(partition.db.engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+class Benchmark:
+    def __init__(self, bot, iterations: int):
+        self.bot = bot
+        self.iterations = iterations
+        self.guild = FakeGuild()
+        self.channel = FakeChannel()
+        self.counter = StatementCounter(bot.database) if bot.database else None
+        self.results: List[Dict] = []
+
+    def context(self, user=None) -> FakeContext:
+        return FakeContext(self.bot, user or FakeUser(), self.guild, self.channel)
+
+    async def user(self) -> FakeUser:
+        user = FakeUser()
+        await self.bot.on_message(FakeMessage(self.channel, user, guild=self.guild))
+        return user
+
+    async def measure(self, name: str, calls):
+        latencies = []
+        statements = self.counter.count if self.counter else 0
+        start = time.perf_counter()
+        for call in calls:
+            began = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        self.results.append(
+            dict(
+                name=name,
+                ops=len(latencies) / elapsed,
+                p50=latencies[len(latencies) // 2] * 1000,
+                p99=latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                * 1000,
+                statements=(
+                    (self.counter.count - statements) / len(latencies)
+                    if self.counter
+                    else 0
+                ),
+            )
+        )
+
+    def report(self):
+        print(
+            "{:<24}{:>12}{:>10}{:>10}{:>12}".format(
+                "command", "ops/s", "p50 ms", "p99 ms", "stmts/op"
+            )
+        )
+        for result in self.results:
+            print(
+                "{name:<24}{ops:>12.0f}{p50:>10.3f}{p99:>10.3f}"
+                "{statements:>12.2f}".format(**result)
+            )
+
+    async def run(self):
+        n = self.iterations
+        economy = self.bot.get_cog("Economy")
+        games = self.bot.get_cog("Games")
+
+        known = await self.user()
+        await self.measure("on_message (new user)", (self.user for _ in range(n)))
+        await self.measure(
+            "on_message (known user)",
+            (
+                lambda: self.bot.on_message(
+                    FakeMessage(self.channel, known, guild=self.guild)
+                )
+                for _ in range(n)
+            ),
+        )
+
+        ctx = self.context(known)
+        await economy.gain(ctx, str(10**9))
+        await self.measure("bal", (lambda: economy.bal(ctx) for _ in range(n)))
+        await self.measure(
+            "gamble", (lambda: economy.gamble(ctx, "10") for _ in range(n))
+        )
+        await self.measure("claim", (lambda: economy.claim(ctx) for _ in range(n)))
+        await self.measure(
+            "deposit", (lambda: economy.deposit(ctx, 10) for _ in range(n))
+        )
+        await self.measure(
+            "withdraw", (lambda: economy.withdraw(ctx, 10) for _ in range(n))
+        )
+        await self.measure(
+            "leaderboard", (lambda: economy.leaderboard(ctx) for _ in range(n))
+        )
+
+        pairs = []
+        for _ in range(n):
+            pairs.append(
+                (self.context(await self.user()), self.context(await self.user()))
+            )
+
+        await self.measure("ttt", (lambda c=c: games.ttt(c) for c, _ in pairs))
+
+        def accept(crosses, noughts):
+            game = games.index.for_player(crosses.author.id)
+            return games.accept(noughts, game.game_id)
+
+        await self.measure("accept", (lambda c=c, o=o: accept(c, o) for c, o in pairs))
+        # Four moves that do not finish the game, which is then ended explicitly.
+        moves = [(0, "1"), (1, "4"), (0, "2"), (1, "5")]
+        await self.measure(
+            "place",
+            (
+                lambda p=p, player=player, m=m: games.place(p[player], m)
+                for p in pairs
+                for player, m in moves
+            ),
+        )
+        await self.measure("end", (lambda c=c: games.end(c) for c, _ in pairs))
+
+
+async def main(iterations: int, write_behind: bool, memory: bool, partitions: int):
+    config = {"dispatch": {"rate": 10**9, "per": 1}, "partitions": partitions}
+    if memory:
+        config["storage"] = "memory"
+    with tempfile.TemporaryDirectory() as directory:
+        if write_behind:
+            config["write_behind"] = {
+                "flush_interval": 1,
+                "journal": os.path.join(directory, "economy.journal"),
+            }
+        bot = create_bot(
+            config, "sqlite:///{}".format(os.path.join(directory, "economy"))
+        )
+        await bot.prepare_storage()
+        benchmark = Benchmark(bot, iterations)
+        try:
+            await benchmark.run()
+        finally:
+            bot.shutdown()
+        benchmark.report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--write-behind", action="store_true")
+    parser.add_argument("--memory", action="store_true", help="use in-memory storage")
+    parser.add_argument("--partitions", type=int, default=1)
+    arguments = parser.parse_args()
+    asyncio.run(
+        main(
+            arguments.iterations,
+            arguments.write_behind,
+            arguments.memory,
+            arguments.partitions,
+        )
+    )
@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("dataset")
+
+from thingv2.accounts import Accounts  # noqa: E402
+from thingv2.schema import PRAGMAS, bootstrap  # noqa: E402
+from thingv2.storage import Database  # noqa: E402
+
+
+@pytest.mark.parametrize("returning", [Accounts.returning, None])
+def test_concurrent_debits_never_overdraw(tmp_path, monkeypatch, returning):
+    monkeypatch.setattr(Accounts, "returning", returning)
+    database = Database("sqlite:///{}".format(tmp_path / "economy"), pragmas=PRAGMAS)
+    bootstrap(database)
+    database.execute_many_sync(
+        "INSERT INTO users (id, nick, balance, bank, claim_cd) "
+        "VALUES (1, 'user', 100, 0, 0)",
+        [{}],
+    )
+    accounts = Accounts(database)
+
+    async def run():
+        return await asyncio.gather(*(accounts.debit(1, 30) for _ in range(10)))
+
+    try:
+        results = asyncio.run(run())
+        assert sum(result is not None for result in results) == 3
+        assert sorted(r.balance for r in results if r) == [10, 40, 70]
+        assert asyncio.run(accounts.get(1)).balance == 10
+        assert asyncio.run(accounts.deposit(1, 50)) is None
+    finally:
+        database.close()
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from thingv2.backends import MemoryStorage, Storage, open_storage
+from thingv2.tictactoe import Game
+
+
+def test_memory_accounts():
+    storage = open_storage("sqlite:///unused", {"storage": "memory"})
+    assert isinstance(storage, MemoryStorage)
+    accounts = storage.accounts
+
+    async def run():
+        await storage.add_user(1, "one")
+        assert await accounts.get(2) is None
+        assert await accounts.credit(2, 10) is None
+
+        await accounts.credit(1, 100)
+        assert await accounts.debit(1, 500) is None
+        account = await accounts.deposit(1, 60)
+        assert (account.balance, account.bank) == (40, 60)
+
+        assert await accounts.claim(1, 5, now=100, cooldown=50)
+        assert not await accounts.claim(1, 5, now=120, cooldown=50)
+        await accounts.reset_claims(110)
+        assert await accounts.claim(1, 5, now=120, cooldown=50, epoch=110)
+
+        assert await storage.balances() == [dict(id=1, balance=50, bank=60)]
+        assert await storage.user_ids(10) == [1]
+
+    asyncio.run(run())
+
+
+def test_memory_games_and_members():
+    storage = MemoryStorage()
+    games = storage.games
+
+    async def run():
+        first = await games.insert(dict(guild_id=1, crosses=10))
+        second = await games.insert(dict(guild_id=1, crosses=20))
+        await games.update(dict(game_id=first, noughts=30), ["game_id"])
+        assert (await games.find_one(game_id=first))["noughts"] == 30
+        assert await games.delete(game_id=second)
+        assert [row["game_id"] for row in await games.find()] == [first]
+
+        await storage.add_member(1, 10)
+        await storage.add_member(2, 10)
+        await storage.remove_member(1, 10)
+        await storage.forget_guild(3)
+        assert await storage.members() == [dict(guild_id=2, user_id=10)]
+
+    asyncio.run(run())
+
+
+def test_memory_game_rows_load_into_games():
+    storage = MemoryStorage()
+
+    async def run():
+        game_id = await storage.games.insert(dict(guild_id=1, crosses=10))
+        return Game.from_row(await storage.games.find_one(game_id=game_id))
+
+    game = asyncio.run(run())
+    assert (game.crosses, game.noughts, game.board.crosses) == (10, None, 0)
+
+
+def test_storage_backends_must_implement_every_method():
+    class Partial(Storage):
+        async def add_user(self, user_id, nick):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,124 @@
+import asyncio
+import io
+import sqlite3
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("dataset")
+
+from thingv2 import backup  # noqa: E402
+from thingv2.partitions import PartitionedDatabase  # noqa: E402
+from thingv2.schema import bootstrap  # noqa: E402
+
+
+@pytest.fixture()
+def database(tmp_path):
+    path = str(tmp_path / "economy")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, nick TEXT, balance INTEGER, "
+        "bank INTEGER, claim_cd INTEGER)"
+    )
+    connection.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, ?, 0)",
+        [(i, "user{}".format(i), i * 10, i) for i in range(2500)],
+    )
+    connection.commit()
+    connection.close()
+    return path
+
+
+def test_backup_copies_database(database, tmp_path):
+    target = str(tmp_path / "copy.db")
+    result = backup.backup(database, target)
+    assert result["pages"] > 4
+    connection = sqlite3.connect(target)
+    assert connection.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 2500
+
+
+def test_backup_finishes_while_the_database_is_written(database, tmp_path):
+    connection = sqlite3.connect(database)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.executemany(
+        "INSERT INTO users VALUES (?, 'x', 0, 0, 0)", [(i,) for i in range(2500, 50000)]
+    )
+    connection.commit()
+    connection.close()
+
+    done = threading.Event()
+    writes = 0
+
+    def write():
+        nonlocal writes
+        connection = sqlite3.connect(database)
+        while not done.is_set():
+            with connection:
+                connection.execute(
+                    "UPDATE users SET balance = balance + 1 WHERE id = ?", (writes,)
+                )
+            writes += 1
+        connection.close()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    target = str(tmp_path / "copy.db")
+    try:
+        while not writes:
+            time.sleep(0.001)
+        backup.backup(database, target)
+    finally:
+        done.set()
+        writer.join()
+
+    copy = sqlite3.connect(target)
+    assert copy.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert copy.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 50000
+    assert writes > 1
+
+
+@pytest.mark.parametrize("fmt", ["jsonl", "csv"])
+def test_export_import_round_trip(database, fmt):
+    connection = backup.connect(database)
+    out = io.StringIO()
+    assert backup.export_table(connection, "users", out, fmt) == 2500
+
+    connection.execute("DELETE FROM users")
+    out.seek(0)
+    rows = backup.read_rows(out, fmt)
+    assert backup.import_table(connection, "users", rows) == 2500
+    assert tuple(
+        connection.execute("SELECT * FROM users WHERE id = 42").fetchone()
+    ) == (42, "user42", 420, 42, 0)
+
+
+def test_partition_exports_use_the_bots_game_ids(tmp_path):
+    database = PartitionedDatabase("sqlite:///{}".format(tmp_path / "economy"), 3)
+    bootstrap(database)
+    games = database["ttt_games"]
+
+    async def run():
+        return [await games.insert(dict(guild_id=guild, crosses=1)) for guild in (4, 5)]
+
+    try:
+        game_ids = asyncio.run(run())
+    finally:
+        database.close()
+
+    exported = []
+    for bucket in range(3):
+        path = str(tmp_path / "ttt_games.{}.jsonl".format(bucket))
+        backup.main(
+            [
+                "export",
+                "{}.{}".format(tmp_path / "economy", bucket),
+                "ttt_games",
+                path,
+                "--partition",
+                "{}/3".format(bucket),
+            ]
+        )
+        with open(path) as f:
+            exported.extend(row["game_id"] for row in backup.read_rows(f, "jsonl"))
+    assert sorted(exported) == sorted(game_ids)
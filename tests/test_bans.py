@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+
+from thingv2.bans import BanCache
+
+
+def user(user_id, name):
+    return SimpleNamespace(id=user_id, name=name, discriminator="0001")
+
+
+class FakeGuild:
+    id = 1
+
+    def __init__(self, users):
+        self.users = users
+        self.downloads = 0
+
+    async def bans(self):
+        self.downloads += 1
+        return [SimpleNamespace(user=u) for u in self.users]
+
+
+def test_ban_cache_downloads_once_and_follows_events():
+    async def run():
+        cache = BanCache()
+        guild = FakeGuild([user(1, "a"), user(2, "b")])
+        assert (await cache.resolve(guild, "b#0001")).id == 2
+
+        cache.banned(guild.id, user(3, "c"))
+        cache.unbanned(guild.id, 1)
+        bans = await cache.get(guild)
+        return guild, bans
+
+    guild, bans = asyncio.run(run())
+    assert guild.downloads == 1
+    assert sorted(bans.by_id) == [2, 3]
+    assert "a#0001" not in bans.by_name
+
+
+def test_pages_are_sliced_lazily():
+    async def run():
+        guild = FakeGuild([user(i, str(i)) for i in range(45)])
+        return await BanCache().get(guild)
+
+    bans = asyncio.run(run())
+    assert bans.pages(20) == 3
+    assert [u.id for u in bans.page(3, 20)] == [40, 41, 42, 43, 44]
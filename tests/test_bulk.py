@@ -0,0 +1,43 @@
+import asyncio
+
+from thingv2.bulk import BulkAction, parse_id_list, parse_targets
+
+A, B, C = 111111111111111111, 222222222222222222, 333333333333333333
+
+
+def test_parse_targets_splits_off_the_reason():
+    text = "<@{}> <@!{}> {} <@{}> raid bots 12".format(A, B, C, A)
+    assert parse_targets(text) == ([A, B, C], "raid bots 12")
+    assert parse_targets("no targets") == ([], "no targets")
+    assert parse_targets("") == ([], "")
+    assert parse_id_list("{}\n{},{}\n".format(A, B, A), 10) == [A, B]
+
+
+def test_parse_id_list_stops_at_the_limit():
+    text = "\n".join(str(A + i) for i in range(200000))
+    assert parse_id_list(text, 1001) == [A + i for i in range(1001)]
+
+
+def test_bulk_action_bounds_concurrency_and_collects_failures():
+    in_flight = peak = 0
+    reports = []
+
+    async def action(target):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        if target % 10 == 0:
+            raise ValueError("Missing Permissions")
+
+    async def progress(run):
+        reports.append(run.finished)
+
+    run = asyncio.run(BulkAction(action, 3, 0, progress).run(list(range(1, 51))))
+    assert peak == 3
+    assert len(run.done) == 45 and len(run.failed) == 5
+    assert reports and reports == sorted(reports)
+    summary = run.summary("Banned", limit=2)
+    assert summary.startswith("Banned 45/50 members.")
+    assert "`10`: Missing Permissions" in summary and "and 3 more." in summary
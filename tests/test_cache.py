@@ -0,0 +1,19 @@
+from thingv2.cache import KnownUsers
+
+
+def test_known_users_evicts_least_recently_seen():
+    known = KnownUsers(maxsize=2)
+    known.add(1)
+    known.add(2)
+    assert 1 in known
+    known.add(3)
+    assert 1 in known
+    assert 2 not in known
+    assert len(known) == 2
+
+
+def test_known_users_warm_respects_maxsize():
+    known = KnownUsers(maxsize=3)
+    known.warm(range(10))
+    assert len(known) == 3
+    assert 0 in known and 3 not in known
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("dataset")
+
+from discord.ext import commands  # noqa: E402
+
+from thingv2 import index  # noqa: E402
+
+
+class Extra(commands.Cog):
+    @commands.command(brief="Says hi.", aliases=["hi"])
+    async def hello(self, ctx, name: str, times: int = 1):
+        pass
+
+
+def overview_names(bot):
+    return [field.name for field in bot.catalogue.overview()["fields"]]
+
+
+def test_catalogue_is_cached_until_commands_change():
+    async def run():
+        bot = index.create_bot({"storage": "memory"})
+        try:
+            overview = bot.catalogue.overview()
+            assert bot.catalogue.overview() is overview
+            assert "Extra" not in overview_names(bot)
+            assert bot.catalogue.detail("hello") is None
+
+            bot.add_cog(Extra())
+            assert "Extra" in overview_names(bot)
+            detail = bot.catalogue.detail("hi")
+            assert detail is bot.catalogue.detail("hello")
+            assert detail["title"] == "t$hello <name> [times = 1]"
+
+            bot.remove_cog("Extra")
+            assert "Extra" not in overview_names(bot)
+            assert bot.catalogue.detail("hello") is None
+
+            bot.remove_command("ttt")
+            assert bot.catalogue.detail("ttt") is None
+            assert bot.catalogue.detail("accept") is not None
+        finally:
+            bot.shutdown()
+
+    asyncio.run(run())
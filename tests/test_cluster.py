@@ -0,0 +1,16 @@
+from thingv2.cluster import cluster_config, split
+
+
+def test_split_deals_out_every_shard_once():
+    groups = split(10, 3)
+    assert groups == [[0, 3, 6, 9], [1, 4, 7], [2, 5, 8]]
+    assert split(2, 4) == [[0], [1]]
+
+
+def test_cluster_config_disables_write_behind():
+    config = {"write_behind": {"flush_interval": 5}, "metrics_file": "m.prom"}
+    clustered = cluster_config(config, 2)
+    assert clustered["write_behind"] is None
+    assert clustered["metrics_file"] == "m.prom.2"
+    assert clustered["leaderboard_refresh"] == 60
+    assert config["write_behind"] == {"flush_interval": 5}
@@ -0,0 +1,44 @@
+from thingv2.cooldowns import Cooldowns
+
+
+def test_remaining_and_reset():
+    cooldowns = Cooldowns(100)
+    assert cooldowns.remaining(1, 0) == 0
+
+    cooldowns.used(1, 10, 10)
+    assert cooldowns.remaining(1, 50) == 60
+    assert cooldowns.remaining(1, 110) == 0
+
+    cooldowns.reset(60)
+    assert cooldowns.remaining(1, 70) == 0
+    cooldowns.used(1, 70, 70)
+    assert cooldowns.remaining(1, 70) == 100
+
+
+def test_expired_entries_are_dropped():
+    cooldowns = Cooldowns(100)
+    for user_id in range(5):
+        cooldowns.used(user_id, user_id * 10, user_id * 10)
+    cooldowns.used(9, 125, 125)
+    assert len(cooldowns) == 3
+    assert cooldowns.remaining(0, 125) == 0
+
+
+def test_entries_recorded_out_of_order_are_dropped():
+    cooldowns = Cooldowns(100)
+    cooldowns.used(1, 100, 100)
+    cooldowns.used(2, 60, 100)
+    cooldowns.used(2, 60, 100)
+    cooldowns.used(3, 0, 100)
+    assert len(cooldowns) == 2
+    cooldowns.used(4, 170, 170)
+    assert len(cooldowns) == 2
+    assert cooldowns.remaining(2, 170) == 0 and cooldowns.remaining(1, 170) == 30
+
+
+def test_epoch_goes_stale():
+    cooldowns = Cooldowns(100, epoch_ttl=30)
+    assert cooldowns.epoch_stale(0)
+    cooldowns.set_epoch(5, 10)
+    assert not cooldowns.epoch_stale(39)
+    assert cooldowns.epoch_stale(40)
@@ -0,0 +1,74 @@
+import asyncio
+
+from thingv2.dispatch import Dispatcher
+
+
+class FakeEmbed:
+    def __init__(self, description=None, title=None):
+        self.description = description
+        self.title = title
+
+    def to_dict(self):
+        data = {"type": "rich", "color": 0}
+        if self.description:
+            data["description"] = self.description
+        if self.title:
+            data["title"] = self.title
+        return data
+
+    def copy(self):
+        return FakeEmbed(self.description, self.title)
+
+
+class FakeChannel:
+    id = 1
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, embed):
+        self.sent.append(embed)
+        await asyncio.sleep(0)
+        return len(self.sent)
+
+
+class FakeContext:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def send(self, embed):
+        return await self.channel.send(embed=embed)
+
+
+def test_coalesces_description_only_embeds():
+    async def run():
+        dispatcher = Dispatcher(coalesce=True)
+        channel = FakeChannel()
+        ctx = FakeContext(channel)
+        results = await asyncio.gather(
+            dispatcher.send(ctx, FakeEmbed("a")),
+            dispatcher.send(ctx, FakeEmbed("b")),
+            dispatcher.send(ctx, FakeEmbed("c")),
+            dispatcher.send(ctx, FakeEmbed("d", title="t")),
+        )
+        return channel, results, dispatcher
+
+    channel, results, dispatcher = asyncio.run(run())
+    assert [embed.description for embed in channel.sent] == ["a\n\nb\n\nc", "d"]
+    assert results == [1, 1, 1, 2]
+    assert dispatcher.metrics()["coalesced"] == 2
+    assert dispatcher.metrics()["queued"] == 0
+
+
+def test_paces_sends_per_channel():
+    async def run():
+        dispatcher = Dispatcher(rate=2, per=0.05)
+        ctx = FakeContext(FakeChannel())
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        await asyncio.gather(*(dispatcher.send(ctx, FakeEmbed("x")) for _ in range(3)))
+        return loop.time() - start, ctx.channel
+
+    elapsed, channel = asyncio.run(run())
+    assert len(channel.sent) == 3
+    assert elapsed >= 0.04
@@ -0,0 +1,290 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("dataset")
+
+from thingv2 import index  # noqa: E402
+
+
+def test_storage_is_opened_off_the_event_loop(tmp_path, monkeypatch):
+    threads = []
+    open_storage = index.open_storage
+
+    def recording_open(*args):
+        threads.append(threading.current_thread())
+        return open_storage(*args)
+
+    monkeypatch.setattr(index, "open_storage", recording_open)
+
+    async def run():
+        bot = index.create_bot({}, "sqlite:///{}".format(tmp_path / "economy"))
+        try:
+            await bot.prepare_storage()
+            storage = bot.storage
+            await bot.prepare_storage()
+            assert bot.storage is storage
+            assert storage.accounts.observer == bot.leaderboard.update
+        finally:
+            bot.shutdown()
+
+    asyncio.run(run())
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+
+
+class FakeContext:
+    def __init__(self, bot, author_id, guild_id):
+        self.bot = bot
+        self.author = SimpleNamespace(id=author_id, name="user")
+        self.guild = SimpleNamespace(id=guild_id)
+        self.channel = SimpleNamespace(id=1)
+        self.sent = []
+
+    async def send(self, embed=None):
+        self.sent.append(embed)
+        return SimpleNamespace(id=len(self.sent), embeds=[embed])
+
+
+def test_leaderboard_options_in_any_order():
+    async def run():
+        bot = index.create_bot({"storage": "memory"})
+        economy = bot.get_cog("Economy")
+        for user_id, balance in [(1, 50), (2, 300), (3, 20)]:
+            await bot.storage.add_user(user_id, "user")
+            await bot.accounts.credit(user_id, balance)
+        await bot.storage.add_member(7, 1)
+
+        ctx = FakeContext(bot, 1, 7)
+        await economy.leaderboard(ctx, "global")
+        await economy.leaderboard(ctx, "2", "GLOBAL", "wallet")
+        await economy.leaderboard(ctx)
+        await economy.leaderboard(ctx, "richest")
+        bot.shutdown()
+        return ctx.sent
+
+    sent = asyncio.run(run())
+    assert sent[0].title == "Total leaderboard (global)"
+    assert sent[0].description.splitlines()[0] == "**1.** <@2> £300"
+    assert sent[1].title == "Wallet leaderboard (global)"
+    assert sent[1].footer.text.startswith("Page 1 of 1.")
+    assert sent[2].title == "Total leaderboard (server)"
+    assert sent[2].description == "**1.** <@1> £50"
+    assert "Use a board" in sent[3].description
+
+
+@pytest.mark.parametrize(
+    "config", [{"storage": "memory"}, {"partitions": 2}], ids=["memory", "sqlite"]
+)
+def test_sweep_only_ends_idle_games_of_owned_guilds(tmp_path, config):
+    owned, other = 5 << 22, 6 << 22
+
+    async def run():
+        bot = index.create_bot(
+            dict(config, ttt={"ttl": 100}),
+            "sqlite:///{}".format(tmp_path / "economy"),
+            shard_count=2,
+            shard_ids=[1],
+        )
+        games_cog = bot.get_cog("Games")
+        try:
+            idle = await bot.games.insert(
+                dict(guild_id=owned, crosses=1, last_active=1)
+            )
+            moved = await bot.games.insert(
+                dict(guild_id=owned, crosses=2, last_active=1)
+            )
+            theirs = await bot.games.insert(
+                dict(guild_id=other, crosses=3, last_active=1)
+            )
+            await games_cog.load_index()
+            assert games_cog.index.get(theirs) is None
+
+            # A move the index has not seen, e.g. from a stale process.
+            await bot.games.update(dict(game_id=moved, last_active=950), ["game_id"])
+            assert await games_cog.sweep(1000) == 1
+            rows = await bot.games.find()
+            assert sorted(row["game_id"] for row in rows) == sorted([moved, theirs])
+            assert games_cog.index.get(idle) is None
+            assert games_cog.index.get(moved).last_active == 950
+        finally:
+            games_cog.cog_unload()
+            bot.shutdown()
+
+    asyncio.run(run())
+
+
+def test_concurrent_ttt_starts_one_game_per_player():
+    async def run():
+        bot = index.create_bot({"storage": "memory"})
+        games_cog = bot.get_cog("Games")
+        insert = bot.games.insert
+        failing = [True]
+
+        async def slow_insert(row):
+            await asyncio.sleep(0)
+            if failing:
+                failing.pop()
+                raise RuntimeError("database is locked")
+            return await insert(row)
+
+        bot.games.insert = slow_insert
+        ctx = FakeContext(bot, 1, 7)
+        try:
+            with pytest.raises(RuntimeError):
+                await games_cog.ttt(ctx)
+            assert not games_cog.index.busy(1)
+
+            await asyncio.gather(games_cog.ttt(ctx), games_cog.ttt(ctx))
+            assert len(await bot.games.find()) == 1
+            assert games_cog.index.for_player(1) and not games_cog.index.starting
+            assert ["already in a game" in embed.description for embed in ctx.sent] == [
+                True,
+                False,
+            ]
+        finally:
+            games_cog.cog_unload()
+            bot.shutdown()
+
+    asyncio.run(run())
+
+
+class FakeBoardMessage:
+    def __init__(self, fail: bool = False):
+        self.embeds = [SimpleNamespace(colour=0xFF0000)]
+        self.edits = []
+        self.fail = fail
+        self.release = asyncio.Event()
+
+    async def edit(self, embed):
+        self.edits.append(embed.description)
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("edit failed")
+
+
+def test_board_edits_are_coalesced_while_one_is_in_flight():
+    async def run():
+        bot = index.create_bot({"storage": "memory"})
+        games_cog = bot.get_cog("Games")
+        game = index.Game(1, 7, 10, 20, message=5)
+        message = games_cog.board_messages[game.game_id] = FakeBoardMessage()
+        try:
+            first = asyncio.ensure_future(games_cog.refresh_board(None, game))
+            await asyncio.sleep(0)
+            for position in (1, 2, 3):
+                game.board.place(position)
+                await games_cog.refresh_board(None, game)
+            message.release.set()
+            await first
+            assert len(message.edits) == 2
+            assert message.edits[-1] == game.board.render()
+            assert not games_cog.pending_edits
+        finally:
+            games_cog.cog_unload()
+            bot.shutdown()
+
+    asyncio.run(run())
+
+
+def test_moves_are_saved_before_the_board_is_edited():
+    async def run():
+        bot = index.create_bot({"storage": "memory"})
+        games_cog = bot.get_cog("Games")
+        game_id = await bot.games.insert(
+            dict(guild_id=7, crosses=10, noughts=20, message=5, last_active=1)
+        )
+        await games_cog.load_index()
+        message = FakeBoardMessage(fail=True)
+        message.release.set()
+        games_cog.board_messages[game_id] = message
+
+        async def delete():
+            pass
+
+        ctx = FakeContext(bot, 10, 7)
+        ctx.message = SimpleNamespace(delete=delete)
+        try:
+            with pytest.raises(RuntimeError):
+                await games_cog.place(ctx, "5")
+            row = await bot.games.find_one(game_id=game_id)
+            assert row["crosses_mask"] == games_cog.index.get(game_id).board.crosses
+            assert row["crosses_mask"] == 1 << 4
+        finally:
+            games_cog.cog_unload()
+            bot.shutdown()
+
+    asyncio.run(run())
+
+
+def test_failed_loads_are_retried():
+    async def run():
+        bot = index.create_bot({"storage": "memory"})
+        games_cog = bot.get_cog("Games")
+        await bot.storage.add_user(1, "user")
+        await bot.accounts.credit(1, 50)
+        await bot.games.insert(dict(guild_id=7, crosses=10, last_active=1))
+
+        async def fail(*args, **kwargs):
+            raise RuntimeError("database is locked")
+
+        balances, find = bot.storage.balances, bot.games.find
+        bot.storage.balances, bot.games.find = fail, fail
+        try:
+            with pytest.raises(RuntimeError):
+                await bot.load_leaderboard()
+            with pytest.raises(RuntimeError):
+                await games_cog.load_index()
+
+            bot.storage.balances, bot.games.find = balances, find
+            await bot.load_leaderboard()
+            assert bot.leaderboard.rankings["total"]
+            await games_cog.load_index()
+            assert games_cog.index.for_player(10)
+        finally:
+            games_cog.cog_unload()
+            bot.shutdown()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "config", [{"storage": "memory"}, {"partitions": 2}], ids=["memory", "sqlite"]
+)
+def test_a_move_during_a_sweep_keeps_the_game(tmp_path, config):
+    async def run():
+        bot = index.create_bot(
+            dict(config, ttt={"ttl": 100}), "sqlite:///{}".format(tmp_path / "economy")
+        )
+        games_cog = bot.get_cog("Games")
+        game_id = await bot.games.insert(
+            dict(guild_id=7, crosses=10, noughts=20, message=5, last_active=1)
+        )
+        await games_cog.on_ready()
+        assert games_cog._sweeper is not None
+        game = games_cog.index.get(game_id)
+        delete = bot.games.delete
+
+        async def delete_then_move(**filters):
+            result = await delete(**filters)
+            # The move lands after the idle row is gone.
+            game.board.place(5)
+            games_cog.index.touch(game, 1000)
+            await bot.games.update(
+                dict(game_id=game_id, crosses_mask=game.board.crosses), ["game_id"]
+            )
+            return result
+
+        bot.games.delete = delete_then_move
+        try:
+            assert await games_cog.sweep(1000) == 0
+            assert games_cog.index.get(game_id) is game
+            row = await bot.games.find_one(game_id=game_id)
+            assert (row["crosses_mask"], row["last_active"]) == (1 << 4, 1000)
+        finally:
+            games_cog.cog_unload()
+            bot.shutdown()
+
+    asyncio.run(run())
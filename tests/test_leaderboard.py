@@ -0,0 +1,55 @@
+from collections import namedtuple
+
+from thingv2.leaderboard import Leaderboard, Ranking
+
+Account = namedtuple("Account", "balance bank claim_cd")
+
+
+def test_ranking_orders_and_moves_users():
+    ranking = Ranking()
+    for user_id, value in [(1, 50), (2, 300), (3, 50), (4, 0)]:
+        ranking.update(user_id, value)
+    assert ranking.page(1, 10) == [(2, 300), (1, 50), (3, 50)]
+    assert ranking.rank(4) is None
+
+    ranking.update(3, 400)
+    ranking.update(2, 0)
+    assert ranking.page(1, 10) == [(3, 400), (1, 50)]
+    assert ranking.rank(1) == 2
+    assert ranking.page(2, 1) == [(1, 50)]
+    assert ranking.pages(1) == 2
+
+
+def test_leaderboard_guild_boards():
+    leaderboard = Leaderboard()
+    leaderboard.update(1, Account(10, 0, 0))
+    leaderboard.load(
+        [dict(id=1, balance=999, bank=0), dict(id=2, balance=5, bank=20)],
+        [dict(guild_id=7, user_id=1), dict(guild_id=7, user_id=2)],
+    )
+    # User 1 changed while loading, so the stale row is ignored.
+    assert leaderboard.board("wallet").page(1, 10) == [(1, 10), (2, 5)]
+    assert leaderboard.board("total", 7).page(1, 10) == [(2, 25), (1, 10)]
+    assert leaderboard.board("bank", 8).page(1, 10) == []
+
+    leaderboard.update(1, Account(10, 100, 0))
+    assert leaderboard.board("bank", 7).rank(1) == 1
+
+    leaderboard.leave(7, 1)
+    assert leaderboard.board("total", 7).page(1, 10) == [(2, 25)]
+    assert leaderboard.board("total").rank(1) == 1
+
+
+def test_refresh_replaces_balances_but_keeps_newer_changes():
+    leaderboard = Leaderboard()
+    leaderboard.load(
+        [dict(id=1, balance=10, bank=0), dict(id=2, balance=20, bank=0)], []
+    )
+    leaderboard.start_refresh()
+    leaderboard.update(3, Account(5, 0, 0))
+    leaderboard.refresh([dict(id=1, balance=99, bank=1), dict(id=3, balance=1, bank=0)])
+    assert leaderboard.board("total").page(1, 10) == [(1, 100), (3, 5)]
+    leaderboard.update(2, Account(7, 0, 0))
+    leaderboard.start_refresh()
+    leaderboard.refresh([])
+    assert leaderboard.board("total").page(1, 10) == []
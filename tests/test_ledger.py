@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("dataset")
+
+from thingv2 import ledger  # noqa: E402
+from thingv2.schema import PRAGMAS, bootstrap  # noqa: E402
+from thingv2.storage import Database  # noqa: E402
+
+
+def test_ledger_snapshot_verify_and_replay(tmp_path):
+    database = Database("sqlite:///{}".format(tmp_path / "economy"), pragmas=PRAGMAS)
+    bootstrap(database)
+    database.execute_many_sync(
+        "INSERT INTO users (id, nick, balance, bank, claim_cd) "
+        "VALUES (:id, 'user', :balance, 0, 0)",
+        [dict(id=1, balance=100), dict(id=2, balance=0)],
+    )
+    accounts = ledger.LedgerAccounts(database)
+
+    async def run():
+        await accounts.credit(1, 50)
+        await accounts.deposit(1, 120)
+        await accounts.claim(2, 300, now=1000, cooldown=10)
+        assert await accounts.debit(2, 500) is None
+        await accounts.flush()
+
+    try:
+        asyncio.run(run())
+        rows = database.db.query("SELECT id, balance, bank, claim_cd FROM users")
+        assert [tuple(row.values()) for row in rows] == [
+            (1, 30, 120, 0),
+            (2, 300, 0, 1000),
+        ]
+        kinds = [row["kind"] for row in database.db.query("SELECT kind FROM ledger")]
+        assert kinds == ["open", "credit", "deposit", "claim"]
+        assert database.write_sync(ledger.verify, database) == []
+
+        database.execute_many_sync(
+            "UPDATE users SET balance = :balance WHERE id = :id",
+            [dict(id=1, balance=7)],
+        )
+        assert len(database.write_sync(ledger.verify, database)) == 1
+        database.write_sync(ledger.replay, database)
+        assert database.write_sync(ledger.verify, database) == []
+    finally:
+        accounts.close()
+        database.close()
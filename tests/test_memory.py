@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import pytest
+
+from thingv2.memory import client_options, rss, size, top_allocations
+
+
+class FakeIntents(SimpleNamespace):
+    @classmethod
+    def default(cls):
+        return cls(members=False, presences=False, typing=True, guilds=True)
+
+
+class FakeMemberCacheFlags:
+    @classmethod
+    def from_intents(cls, intents):
+        return ("flags", intents.members)
+
+    @classmethod
+    def none(cls):
+        return ("none",)
+
+
+def test_no_memory_section_keeps_library_defaults():
+    assert client_options({}) == {}
+
+
+def test_options_before_intents():
+    options = client_options({"memory": {}}, SimpleNamespace())
+    assert options == dict(
+        max_messages=1000, fetch_offline_members=False, guild_subscriptions=False
+    )
+    options = client_options(
+        {"memory": {"max_messages": 0, "member_events": True}}, SimpleNamespace()
+    )
+    assert options == dict(
+        max_messages=None, fetch_offline_members=False, guild_subscriptions=True
+    )
+
+
+def test_options_with_intents():
+    discord = SimpleNamespace(
+        Intents=FakeIntents, MemberCacheFlags=FakeMemberCacheFlags
+    )
+    options = client_options(
+        {"memory": {"max_messages": 100, "members": True}}, discord
+    )
+    assert options["max_messages"] == 100
+    assert options["intents"].members and not options["intents"].presences
+    assert not options["intents"].typing
+    assert options["member_cache_flags"] == ("flags", True)
+    assert options["chunk_guilds_at_startup"]
+
+    options = client_options({"memory": {}}, discord)
+    assert not options["intents"].members
+    assert options["member_cache_flags"] == ("none",)
+    assert not options["chunk_guilds_at_startup"]
+
+    options = client_options({"memory": {"member_events": True}}, discord)
+    assert options["intents"].members
+    assert options["member_cache_flags"] == ("none",)
+
+
+def test_options_with_installed_discord():
+    discord = pytest.importorskip("discord")
+    options = client_options({"memory": {"presences": True}})
+    if hasattr(discord, "Intents"):
+        assert options["intents"].presences and not options["intents"].members
+        assert options["member_cache_flags"].value == 0
+    else:
+        assert options["guild_subscriptions"]
+
+
+def test_default_intents_are_not_privileged():
+    discord = pytest.importorskip("discord")
+    if not hasattr(discord, "Intents"):
+        pytest.skip("discord.py before 1.5 has no intents")
+    expected = discord.Intents.default()
+    expected.members = expected.presences = expected.typing = False
+    assert client_options({"memory": {}})["intents"].value == expected.value
+
+
+def test_report_helpers():
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        blocks = [bytearray(1000) for _ in range(100)]
+        top = top_allocations(5)
+    finally:
+        tracemalloc.stop()
+    assert blocks and top and top[0][1] >= 100000
+    assert rss() > 0
+    assert size(512) == "512B" and size(3 * 1024**2) == "3MiB"
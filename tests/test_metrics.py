@@ -0,0 +1,27 @@
+from thingv2.metrics import Histogram, Metrics, current_command
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    for seconds in [0.0005] * 98 + [0.2, 3]:
+        histogram.observe(seconds)
+    assert histogram.count == 100
+    assert histogram.quantile(0.5) == 0.001
+    assert histogram.quantile(0.99) == 0.25
+    assert histogram.quantile(1) == 5
+
+
+def test_database_time_is_attributed_to_command():
+    metrics = Metrics()
+    metrics.observe_database("read", 0.01)
+    token = current_command.set("bal")
+    try:
+        metrics.observe_database("write", 0.02)
+    finally:
+        current_command.reset(token)
+    metrics.error("bal", ValueError())
+
+    assert set(metrics.database) == {("-", "read"), ("bal", "write")}
+    text = metrics.prometheus()
+    assert 'thingv2_database_seconds_count{command="bal",kind="write"} 1' in text
+    assert 'thingv2_command_errors_total{command="bal",error="ValueError"} 1' in text
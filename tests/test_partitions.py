@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("dataset")
+
+from thingv2.partitions import PartitionedDatabase, migrate  # noqa: E402
+from thingv2.schema import bootstrap  # noqa: E402
+from thingv2.storage import Database  # noqa: E402
+
+
+def test_games_are_routed_by_guild(tmp_path):
+    database = PartitionedDatabase("sqlite:///{}".format(tmp_path / "economy"), 3)
+    bootstrap(database)
+    games = database["ttt_games"]
+
+    async def run():
+        first = await games.insert(dict(guild_id=4, crosses=1))
+        second = await games.insert(dict(guild_id=5, crosses=2))
+        assert (first % 3, second % 3) == (1, 2)
+
+        await games.update(dict(game_id=second, noughts=3), ["game_id"])
+        row = await games.find_one(game_id=second)
+        assert (row["crosses"], row["noughts"]) == (2, 3)
+
+        await games.delete(game_id=first)
+        assert [row["game_id"] for row in await games.find()] == [second]
+
+        await database.route(7).execute(
+            "INSERT INTO users (id, nick) VALUES (:id, 'seven')", id=7
+        )
+        assert await database.partitions[1].query("SELECT id FROM users") == [
+            dict(id=7)
+        ]
+        assert await database.query("SELECT id FROM users") == [dict(id=7)]
+
+    try:
+        asyncio.run(run())
+    finally:
+        database.close()
+
+
+def test_migrate_splits_tables_and_keeps_settings(tmp_path):
+    source = str(tmp_path / "economy")
+    database = Database("sqlite:///{}".format(source))
+    bootstrap(database)
+    database.execute_many_sync(
+        "INSERT INTO users (id, nick, balance) VALUES (:id, 'user', :id)",
+        [dict(id=i) for i in range(1, 7)],
+    )
+    database.execute_many_sync(
+        "INSERT INTO settings (key, value) VALUES (:key, :value)",
+        [dict(key="claim_epoch", value=1234), dict(key="ledger_snapshot", value=9)],
+    )
+    database.close()
+
+    url = "sqlite:///{}".format(tmp_path / "split")
+    counts = migrate(source, url, 3)
+    assert counts["users"] == 6 and counts["settings"] == 1
+
+    split = PartitionedDatabase(url, 3)
+    try:
+        assert [
+            sorted(
+                row["id"]
+                for row in split.partitions[bucket].db.query("SELECT id FROM users")
+            )
+            for bucket in range(3)
+        ] == [[3, 6], [1, 4], [2, 5]]
+        settings = list(
+            split.partitions[0].db.query("SELECT key, value FROM settings ORDER BY key")
+        )
+        assert [tuple(row.values()) for row in settings] == [
+            ("claim_epoch", 1234),
+            ("partitions", 3),
+        ]
+    finally:
+        split.close()
+
+
+def test_opening_with_another_number_of_partitions_fails(tmp_path):
+    url = "sqlite:///{}".format(tmp_path / "economy")
+    database = PartitionedDatabase(url, 3)
+    try:
+        bootstrap(database)
+        bootstrap(database)
+    finally:
+        database.close()
+
+    database = PartitionedDatabase(url, 2)
+    try:
+        with pytest.raises(RuntimeError, match="3 partitions, not 2"):
+            bootstrap(database)
+    finally:
+        database.close()
@@ -0,0 +1,43 @@
+import pytest
+
+dataset = pytest.importorskip("dataset")
+
+from thingv2.schema import INDEXES, POSITIONS, TABLES, bootstrap  # noqa: E402
+from thingv2.storage import Database  # noqa: E402
+
+
+def test_bootstrap_upgrades_tables_created_by_dataset(tmp_path):
+    url = "sqlite:///{}".format(tmp_path / "economy")
+    legacy = dataset.connect(url)
+    legacy["users"].insert(dict(id=1, nick="a", balance=10))
+    legacy.create_table("ttt_games", primary_id="game_id").insert(
+        dict(guild_id=1, crosses=2, noughts=3, message=4, turn="noughts")
+    )
+    legacy.executable.close()
+    legacy.engine.dispose()
+
+    database = Database(url)
+    try:
+        bootstrap(database)
+        db = database.db
+        for table, columns in TABLES.items():
+            names = {
+                row["name"] for row in db.query("PRAGMA table_info({})".format(table))
+            }
+            assert names == {column[0] for column in columns}
+        indexes = {
+            row["name"]
+            for row in db.query("SELECT name FROM sqlite_master WHERE type = 'index'")
+        }
+        assert set(INDEXES) <= indexes
+
+        user = db["users"].find_one(id=1)
+        assert (user["balance"], user["bank"], user["claim_cd"]) == (10, 0, 0)
+        game = db["ttt_games"].find_one(game_id=1)
+        assert (game["turn"], game["positions"], game["crosses_mask"]) == (
+            "noughts",
+            POSITIONS,
+            0,
+        )
+    finally:
+        database.close()
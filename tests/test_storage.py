@@ -0,0 +1,55 @@
+import asyncio
+import gc
+import logging
+
+import pytest
+
+pytest.importorskip("dataset")
+
+from thingv2.schema import PRAGMAS, bootstrap  # noqa: E402
+from thingv2.storage import Database  # noqa: E402
+
+
+def test_tables_and_statements_run_off_the_loop(tmp_path):
+    database = Database("sqlite:///{}".format(tmp_path / "economy"), pragmas=PRAGMAS)
+    bootstrap(database)
+    games = database["ttt_games"]
+    kinds = []
+    database.observer = lambda kind, seconds: kinds.append(kind)
+
+    async def run():
+        game_id = await games.insert(dict(guild_id=1, crosses=2))
+        await games.update(dict(game_id=game_id, noughts=3), ["game_id"])
+        row = await games.find_one(game_id=game_id)
+        assert (row["crosses"], row["noughts"]) == (2, 3)
+        assert len(await games.find(guild_id=1)) == 1
+
+        await database.execute_many(
+            "INSERT INTO users (id, nick) VALUES (:id, :nick)",
+            [dict(id=1, nick="a"), dict(id=2, nick="b")],
+        )
+        rows = await database.query("SELECT id FROM users ORDER BY id")
+        assert [row["id"] for row in rows] == [1, 2]
+        assert await games.delete(game_id=game_id)
+        assert await games.find() == []
+
+    try:
+        asyncio.run(run())
+        assert set(kinds) == {"read", "write"}
+    finally:
+        database.close()
+
+
+def test_close_releases_connections_on_their_own_threads(tmp_path, caplog):
+    database = Database("sqlite:///{}".format(tmp_path / "economy"), workers=3)
+    bootstrap(database)
+
+    async def run():
+        await asyncio.gather(*(database.query("SELECT 1") for _ in range(20)))
+
+    asyncio.run(run())
+    list(database.db.query("SELECT 1"))
+    with caplog.at_level(logging.ERROR):
+        database.close()
+        gc.collect()
+    assert not caplog.records
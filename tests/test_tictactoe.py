@@ -0,0 +1,123 @@
+import json
+
+from thingv2.tictactoe import Board, Game, GameIndex, choose_move
+
+
+def test_turns_alternate_and_taken_spots_are_rejected():
+    board = Board()
+    assert board.turn == "crosses"
+    assert board.place(5)
+    assert board.turn == "noughts"
+    assert not board.place(5)
+    assert board.place(1)
+    assert board.symbol(5) == "X" and board.symbol(1) == "O"
+
+
+def test_winner_reports_side_and_line():
+    board = Board()
+    for position in [1, 4, 2, 5, 3]:
+        board.place(position)
+    assert board.winner() == ("crosses", "Rows")
+
+    board = Board()
+    for position in [1, 3, 2, 5, 4, 7]:
+        board.place(position)
+    assert board.winner() == ("noughts", "Diagonals")
+
+
+def test_full_board_without_winner_is_a_tie():
+    board = Board()
+    for position in [1, 2, 3, 5, 4, 6, 8, 7, 9]:
+        board.place(position)
+    assert board.winner() is None
+    assert board.is_full()
+
+
+def test_from_row_reads_legacy_positions():
+    positions = {str(i): " " for i in range(1, 10)}
+    positions.update({"1": "X", "9": "O"})
+    row = dict(crosses_mask=0, noughts_mask=0, positions=json.dumps(positions))
+    board = Board.from_row(row)
+    assert (board.crosses, board.noughts) == (0b1, 0b100000000)
+    assert board.turn == "crosses"
+
+
+def test_game_index_tracks_players_through_join_and_remove():
+    index = GameIndex()
+    index.load(
+        [
+            dict(
+                game_id=7,
+                guild_id=1,
+                crosses=10,
+                noughts=None,
+                message=None,
+                crosses_mask=0,
+                noughts_mask=0,
+            )
+        ]
+    )
+    game = index.get(7)
+    assert index.for_player(10) is game
+
+    index.join(game, 20)
+    assert index.for_player(20) is game and game.player("noughts") == 20
+
+    index.remove(game)
+    assert not index.get(7)
+    assert not index.for_player(10) and not index.for_player(20)
+
+
+def test_game_index_expires_untouched_games():
+    index = GameIndex()
+    rows = [
+        dict(
+            game_id=game_id,
+            guild_id=1,
+            crosses=game_id * 10,
+            noughts=None,
+            message=None,
+            crosses_mask=0,
+            noughts_mask=0,
+            last_active=last_active,
+        )
+        for game_id, last_active in [(1, 100), (2, 0), (3, 150)]
+    ]
+    index.load(rows, now=120)
+
+    index.touch(index.get(1), 200)
+    index.touch(index.get(1), 200)
+    assert [game.game_id for game in index.expired(150)] == [2, 3]
+
+    for game in index.expired(200):
+        index.remove(game)
+    assert len(index) == 2 and not index.get(1)
+
+
+def test_perfect_play_never_loses():
+    def outcomes(board, bot):
+        if board.winner():
+            yield board.winner()[0]
+        elif board.is_full():
+            yield None
+        elif board.turn == bot:
+            board = Board(board.crosses, board.noughts)
+            board.place(choose_move(board))
+            yield from outcomes(board, bot)
+        else:
+            for position in board.empty():
+                child = Board(board.crosses, board.noughts)
+                child.place(position)
+                yield from outcomes(child, bot)
+
+    for bot in ("crosses", "noughts"):
+        assert set(outcomes(Board(), bot)) <= {bot, None}
+
+
+def test_bot_games_are_only_indexed_for_the_human():
+    index = GameIndex()
+    game = Game(1, 10, 100, 999, skill=1.0)
+    index.add(game)
+    assert index.for_player(100) is game and index.for_player(999) is None
+    index.remove(game)
+    assert not index.by_player
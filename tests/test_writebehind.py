@@ -0,0 +1,87 @@
+import asyncio
+import glob
+
+import pytest
+
+pytest.importorskip("dataset")
+
+from thingv2.schema import PRAGMAS, bootstrap  # noqa: E402
+from thingv2.storage import Database  # noqa: E402
+from thingv2.writebehind import WriteBehindAccounts  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = Database("sqlite:///{}".format(tmp_path / "economy"), pragmas=PRAGMAS)
+    bootstrap(database)
+    database.execute_many_sync(
+        "INSERT INTO users (id, nick, balance, bank, claim_cd) "
+        "VALUES (:id, 'user', 100, 0, 0)",
+        [dict(id=1), dict(id=2)],
+    )
+    yield database
+    database.close()
+
+
+def balances(database):
+    rows = database.db.query("SELECT id, balance, bank FROM users ORDER BY id")
+    return [tuple(row.values()) for row in rows]
+
+
+def test_flush_writes_accounts_and_drops_covered_segments(database, tmp_path):
+    journal = str(tmp_path / "economy.journal")
+    accounts = WriteBehindAccounts(database, journal=journal)
+
+    async def run():
+        await accounts.credit(1, 50)
+        await accounts.deposit(2, 40)
+        assert balances(database) == [(1, 100, 0), (2, 100, 0)]
+        await accounts.flush()
+
+    asyncio.run(run())
+    assert balances(database) == [(1, 150, 0), (2, 60, 40)]
+    assert glob.glob(journal + ".*") == [journal + ".1"]
+
+    accounts.close()
+    assert glob.glob(journal + ".*") == []
+
+
+def test_unflushed_changes_are_recovered_from_the_journal(database, tmp_path):
+    journal = str(tmp_path / "economy.journal")
+    accounts = WriteBehindAccounts(database, journal=journal)
+
+    async def run():
+        await accounts.credit(1, 50)
+        await accounts.debit(1, 20)
+        await accounts.withdraw(2, 10)
+
+    asyncio.run(run())
+    # Crash: no flush or close, and the last line was only half written.
+    accounts._file.write('{"id": 2, "bal')
+    accounts._file.flush()
+    del accounts
+    assert balances(database) == [(1, 100, 0), (2, 100, 0)]
+
+    accounts = WriteBehindAccounts(database, journal=journal)
+    assert balances(database) == [(1, 130, 0), (2, 100, 0)]
+    assert glob.glob(journal + ".*") == [journal + ".0"]
+    accounts.close()
+    assert glob.glob(journal + ".*") == []
+
+
+def test_only_written_back_accounts_are_evicted(database, tmp_path):
+    accounts = WriteBehindAccounts(
+        database, journal=str(tmp_path / "economy.journal"), cache_size=1
+    )
+
+    async def run():
+        await accounts.credit(1, 50)
+        assert (await accounts.get(2)).balance == 100
+        assert set(accounts._accounts) == {1, 2}
+        await accounts.flush()
+        assert set(accounts._accounts) == {2}
+        assert (await accounts.get(1)).balance == 150
+        assert set(accounts._accounts) == {1}
+
+    asyncio.run(run())
+    accounts.close()
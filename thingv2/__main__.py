@@ -0,0 +1,25 @@
+import json
+import sys
+
+from thingv2.cluster import launch
+from thingv2.index import create_bot
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "config.json"
+    with open(path) as f:
+        config = json.load(f)
+
+    if config.get("clusters", 1) > 1:
+        launch(config)
+        return
+
+    bot = create_bot(config, config.get("database", "sqlite:///economy"))
+    try:
+        bot.run(config["token"])
+    finally:
+        bot.shutdown()
+
+
+if __name__ == "__main__":
+    main()
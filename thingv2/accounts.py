@@ -0,0 +1,138 @@
+import sqlite3
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+
+if TYPE_CHECKING:
+    from thingv2.storage import Database
+
+
+class Account(NamedTuple):
+    balance: int
+    bank: int
+    claim_cd: int
+
+
+class Accounts:
+    """Economy operations on the ``users`` table.
+
+    Every mutation is one conditional ``UPDATE ... RETURNING`` statement, so a
+    check and its write can never be interleaved with another command. SQLite
+    before 3.35 has no ``RETURNING``; there the ``UPDATE`` and a ``SELECT`` of
+    the new values run in one transaction on the writer thread instead. A
+    method returns ``None`` when its condition did not hold (missing account,
+    insufficient funds or an active cooldown) and nothing was changed.
+
+    ``observer``, when set, is called with the user id and new account after
+    every successful mutation.
+    """
+
+    returning: Optional[str] = (
+        "RETURNING balance, bank, claim_cd"
+        if sqlite3.sqlite_version_info >= (3, 35)
+        else None
+    )
+
+    def __init__(self, database: "Database"):
+        self.database = database
+        self.observer: Optional[Callable[[int, Account], None]] = None
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    @staticmethod
+    def _update_and_select(
+        database: "Database", sql: str, params: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        with database.db:
+            connection = database.db.executable
+            if not connection.execute(text(sql), **params).rowcount:
+                return []
+            rows = connection.execute(
+                text("SELECT balance, bank, claim_cd FROM users WHERE id = :id"),
+                id=params["id"],
+            )
+            return [dict(row) for row in rows]
+
+    async def _update(self, sql: str, **params) -> Optional[Account]:
+        database = self.database.route(params["id"])
+        if self.returning:
+            rows = await database.execute("{} {}".format(sql, self.returning), **params)
+        else:
+            rows = await database.write(self._update_and_select, database, sql, params)
+        if not rows:
+            return None
+        account = Account(**rows[0])
+        if self.observer:
+            self.observer(params["id"], account)
+        return account
+
+    async def get(self, user_id: int) -> Optional[Account]:
+        rows = await self.database.route(user_id).query(
+            "SELECT balance, bank, claim_cd FROM users WHERE id = :id", id=user_id
+        )
+        return Account(**rows[0]) if rows else None
+
+    async def credit(
+        self, user_id: int, amount: int, stake: int = 0
+    ) -> Optional[Account]:
+        return await self._update(
+            "UPDATE users SET balance = balance + :amount "
+            "WHERE id = :id AND balance >= :stake",
+            id=user_id,
+            amount=amount,
+            stake=stake,
+        )
+
+    async def debit(self, user_id: int, amount: int) -> Optional[Account]:
+        return await self.credit(user_id, -amount, stake=amount)
+
+    async def deposit(self, user_id: int, amount: int) -> Optional[Account]:
+        return await self._update(
+            "UPDATE users SET balance = balance - :amount, bank = bank + :amount "
+            "WHERE id = :id AND balance >= :amount",
+            id=user_id,
+            amount=amount,
+        )
+
+    async def withdraw(self, user_id: int, amount: int) -> Optional[Account]:
+        return await self._update(
+            "UPDATE users SET balance = balance + :amount, bank = bank - :amount "
+            "WHERE id = :id AND bank >= :amount",
+            id=user_id,
+            amount=amount,
+        )
+
+    async def claim(
+        self, user_id: int, amount: int, now: int, cooldown: int, epoch: int = 0
+    ) -> Optional[Account]:
+        """Claims made before ``epoch`` (the last :meth:`reset_claims`) do not
+        count towards the cooldown."""
+        return await self._update(
+            "UPDATE users SET balance = balance + :amount, claim_cd = :now "
+            "WHERE id = :id AND (claim_cd + :cooldown <= :now OR claim_cd < :epoch)",
+            id=user_id,
+            amount=amount,
+            now=now,
+            cooldown=cooldown,
+            epoch=epoch,
+        )
+
+    async def claim_epoch(self) -> int:
+        rows = await self.database.route(0).query(
+            "SELECT value FROM settings WHERE key = 'claim_epoch'"
+        )
+        return rows[0]["value"] if rows else 0
+
+    async def reset_claims(self, now: int):
+        await self.database.route(0).execute(
+            "INSERT INTO settings (key, value) VALUES ('claim_epoch', :now) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            now=now,
+        )
@@ -0,0 +1,300 @@
+"""Where the bot keeps its accounts, games and guild members.
+
+``config["storage"]`` picks the backend: ``"sqlite"`` (the default) or
+``"memory"``, which keeps everything in dictionaries and loses it on exit.
+"""
+
+import operator
+from abc import ABC, abstractmethod
+from itertools import count, islice
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from thingv2.accounts import Account, Accounts
+from thingv2.writebehind import CachedAccounts
+
+
+class Storage(ABC):
+    """Everything the cogs need from a backend.
+
+    ``accounts`` is an :class:`~thingv2.accounts.Accounts`, which also keeps
+    the claim cooldown epoch, and ``games`` is a table of Tic Tac Toe games
+    with awaitable ``find``, ``find_one``, ``insert``, ``update`` and
+    ``delete``.
+    """
+
+    accounts: Accounts
+    games: Any
+
+    @abstractmethod
+    async def add_user(self, user_id: int, nick: str):
+        pass
+
+    @abstractmethod
+    async def user_ids(self, limit: int) -> List[int]:
+        pass
+
+    @abstractmethod
+    async def balances(self) -> List[Dict[str, int]]:
+        """``id``, ``balance`` and ``bank`` of every user with any money."""
+
+    @abstractmethod
+    async def members(self) -> List[Dict[str, int]]:
+        pass
+
+    @abstractmethod
+    async def add_member(self, guild_id: int, user_id: int):
+        pass
+
+    @abstractmethod
+    async def remove_member(self, guild_id: int, user_id: int):
+        pass
+
+    @abstractmethod
+    async def forget_guild(self, guild_id: int):
+        pass
+
+    def start(self):
+        self.accounts.start()
+
+    async def flush(self):
+        await self.accounts.flush()
+
+    def close(self):
+        self.accounts.close()
+
+
+class SqliteStorage(Storage):
+    def __init__(
+        self,
+        url: str,
+        config: Dict[str, Any],
+        observer: Optional[Callable[[str, float], None]] = None,
+    ):
+        from thingv2.ledger import LedgerAccounts
+        from thingv2.partitions import open_database
+        from thingv2.schema import bootstrap
+        from thingv2.writebehind import WriteBehindAccounts
+
+        self.database = open_database(url, config)
+        self.database.observer = observer
+        print(
+            "SQLite settings:",
+            ", ".join(
+                "{}={}".format(*setting) for setting in bootstrap(self.database).items()
+            ),
+        )
+
+        if config.get("ledger"):
+            self.accounts = LedgerAccounts(self.database, **config["ledger"])
+        elif config.get("write_behind"):
+            self.accounts = WriteBehindAccounts(self.database, **config["write_behind"])
+        else:
+            self.accounts = Accounts(self.database)
+        self.games = self.database["ttt_games"]
+
+    async def add_user(self, user_id: int, nick: str):
+        await self.database.route(user_id).execute(
+            "INSERT OR IGNORE INTO users (id, nick, balance, bank, claim_cd) "
+            "VALUES (:id, :nick, 0, 0, 0)",
+            id=user_id,
+            nick=nick,
+        )
+
+    async def user_ids(self, limit: int) -> List[int]:
+        rows = await self.database.query(
+            "SELECT id FROM users LIMIT :limit", limit=limit
+        )
+        return [row["id"] for row in rows]
+
+    async def balances(self) -> List[Dict[str, int]]:
+        return await self.database.query(
+            "SELECT id, balance, bank FROM users WHERE balance > 0 OR bank > 0"
+        )
+
+    async def members(self) -> List[Dict[str, int]]:
+        return await self.database.query("SELECT guild_id, user_id FROM guild_members")
+
+    async def add_member(self, guild_id: int, user_id: int):
+        await self.database.route(user_id).execute(
+            "INSERT OR IGNORE INTO guild_members (guild_id, user_id) "
+            "VALUES (:guild_id, :user_id)",
+            guild_id=guild_id,
+            user_id=user_id,
+        )
+
+    async def remove_member(self, guild_id: int, user_id: int):
+        await self.database.route(user_id).execute(
+            "DELETE FROM guild_members WHERE guild_id = :guild_id AND user_id = :user_id",
+            guild_id=guild_id,
+            user_id=user_id,
+        )
+
+    async def forget_guild(self, guild_id: int):
+        await self.database.execute(
+            "DELETE FROM guild_members WHERE guild_id = :guild_id", guild_id=guild_id
+        )
+
+    def close(self):
+        super().close()
+        self.database.close()
+
+
+class MemoryAccounts(CachedAccounts):
+    """Accounts that only ever live in memory."""
+
+    def __init__(self):
+        super().__init__(None)
+        self.epoch = 0
+
+    async def _read(self, user_id: int) -> Optional[Account]:
+        return None
+
+    async def _store(self, user_id: int, account: Account, kind: str) -> Account:
+        self._accounts[user_id] = account
+        if self.observer:
+            self.observer(user_id, account)
+        return account
+
+    async def claim_epoch(self) -> int:
+        return self.epoch
+
+    async def reset_claims(self, now: int):
+        self.epoch = now
+
+    def open(self, user_id: int):
+        """Give ``user_id`` an empty account unless they have one."""
+        self._accounts.setdefault(user_id, Account(0, 0, 0))
+
+    def user_ids(self, limit: int) -> List[int]:
+        return list(islice(self._accounts, limit))
+
+    def balances(self) -> List[Dict[str, int]]:
+        return [
+            dict(id=user_id, balance=account.balance, bank=account.bank)
+            for user_id, account in self._accounts.items()
+            if account.balance > 0 or account.bank > 0
+        ]
+
+
+OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+def _matches(value: Any, condition: Any) -> bool:
+    if isinstance(condition, list):
+        return value in condition
+    if isinstance(condition, dict):
+        return all(
+            value is not None and OPERATORS[op](value, operand)
+            for op, operand in condition.items()
+        )
+    return value == condition
+
+
+class MemoryTable:
+    """A table of dict rows with an autoincrement ``primary_key``. Inserted
+    rows start from ``defaults``, like columns with a default value."""
+
+    def __init__(self, primary_key: str, defaults: Optional[Dict[str, Any]] = None):
+        self.primary_key = primary_key
+        self.defaults = defaults or {}
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self._ids = count(1)
+
+    def _matching(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Rows equal to every filter, in it for list filters, or compared
+        with it for ``{operator: value}`` filters."""
+        if self.primary_key in filters:
+            keys = filters[self.primary_key]
+            keys = keys if isinstance(keys, list) else [keys]
+            candidates = [self.rows[key] for key in keys if key in self.rows]
+        else:
+            candidates = list(self.rows.values())
+        return [
+            row
+            for row in candidates
+            if all(_matches(row.get(key), value) for key, value in filters.items())
+        ]
+
+    async def find(self, **filters) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._matching(filters)]
+
+    async def find_one(self, **filters) -> Optional[Dict[str, Any]]:
+        rows = self._matching(filters)
+        return dict(rows[0]) if rows else None
+
+    async def insert(self, row: Dict[str, Any]) -> int:
+        row_id = row.get(self.primary_key) or next(self._ids)
+        self.rows[row_id] = dict(
+            self.defaults, **dict(row, **{self.primary_key: row_id})
+        )
+        return row_id
+
+    async def update(self, row: Dict[str, Any], keys: List[str]) -> int:
+        matching = self._matching({key: row[key] for key in keys})
+        for match in matching:
+            match.update(row)
+        return len(matching)
+
+    async def delete(self, **filters) -> bool:
+        matching = self._matching(filters)
+        for row in matching:
+            del self.rows[row[self.primary_key]]
+        return bool(matching)
+
+
+class MemoryStorage(Storage):
+    def __init__(self):
+        self.accounts = MemoryAccounts()
+        self.games = MemoryTable(
+            "game_id",
+            dict(
+                guild_id=None,
+                crosses=None,
+                noughts=None,
+                message=None,
+                crosses_mask=0,
+                noughts_mask=0,
+                channel=None,
+                last_active=0,
+                skill=None,
+            ),
+        )
+        self.guilds: Dict[int, Set[int]] = {}
+
+    async def add_user(self, user_id: int, nick: str):
+        self.accounts.open(user_id)
+
+    async def user_ids(self, limit: int) -> List[int]:
+        return self.accounts.user_ids(limit)
+
+    async def balances(self) -> List[Dict[str, int]]:
+        return self.accounts.balances()
+
+    async def members(self) -> List[Dict[str, int]]:
+        return [
+            dict(guild_id=guild_id, user_id=user_id)
+            for guild_id, users in self.guilds.items()
+            for user_id in users
+        ]
+
+    async def add_member(self, guild_id: int, user_id: int):
+        self.guilds.setdefault(guild_id, set()).add(user_id)
+
+    async def remove_member(self, guild_id: int, user_id: int):
+        self.guilds.get(guild_id, set()).discard(user_id)
+
+    async def forget_guild(self, guild_id: int):
+        self.guilds.pop(guild_id, None)
+
+
+def open_storage(
+    url: str,
+    config: Dict[str, Any],
+    observer: Optional[Callable[[str, float], None]] = None,
+) -> Storage:
+    backend = config.get("storage", "sqlite")
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SqliteStorage(url, config, observer)
+    raise ValueError("Unknown storage backend {}".format(backend))
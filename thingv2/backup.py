@@ -0,0 +1,229 @@
+"""Online backups and streaming export/import of the economy database.
+
+Usable while the bot is running::
+
+    python -m thingv2.backup backup economy backups/economy.db
+    python -m thingv2.backup export economy users users.jsonl
+    python -m thingv2.backup import economy users users.csv
+
+Exports of a partition file take ``--partition 3/8`` for bucket 3 of 8.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from itertools import islice
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy.engine.url import make_url
+
+from thingv2.partitions import ROUTING
+from thingv2.schema import PRAGMAS, TABLES
+
+BATCH = 1000
+
+
+def sqlite_path(url: str) -> str:
+    return make_url(url).database
+
+
+def connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA busy_timeout = {}".format(PRAGMAS["busy_timeout"]))
+    return connection
+
+
+def backup(
+    source: str, target: str, progress: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, float]:
+    """Copy ``source`` to ``target`` with SQLite's online backup API.
+
+    The copy is made in a single step inside one read transaction. Copying a
+    few pages at a time would let a write from the bot restart the backup from
+    the beginning, over and over on a busy bot. In WAL mode the read
+    transaction does not block the bot's writer, which keeps committing to the
+    WAL while the copy runs. The backup is written next to ``target`` and
+    moved into place once it is complete.
+    """
+    started = time.perf_counter()
+    temporary = "{}.tmp".format(target)
+    total = 0
+
+    def step(status, remaining, count):
+        nonlocal total
+        total = count
+        if progress:
+            progress(count - remaining, count)
+
+    source_connection = connect(source)
+    target_connection = sqlite3.connect(temporary)
+    try:
+        source_connection.backup(target_connection, pages=-1, progress=step)
+    finally:
+        target_connection.close()
+        source_connection.close()
+    os.replace(temporary, target)
+    return dict(pages=total, seconds=time.perf_counter() - started)
+
+
+def columns(table: str) -> List[str]:
+    if table not in TABLES:
+        raise ValueError("Unknown table {}".format(table))
+    return [column for column, _, _ in TABLES[table]]
+
+
+def fmt_for(path: str, fmt: Optional[str] = None) -> str:
+    fmt = fmt or ("csv" if path.endswith(".csv") else "jsonl")
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError("Unknown format {}".format(fmt))
+    return fmt
+
+
+def export_table(
+    connection: sqlite3.Connection,
+    table: str,
+    out: IO[str],
+    fmt: str = "jsonl",
+    bucket: int = 0,
+    buckets: int = 1,
+) -> int:
+    """Write every row of ``table`` to ``out``, one batch in memory at a time.
+
+    For one of several partitions, ids are written as the bot shows them,
+    ``local_id * buckets + bucket``, rather than as stored in the file.
+    """
+    names = columns(table)
+    selected = list(names)
+    if buckets > 1 and table in ROUTING:
+        id_column = ROUTING[table][1]
+        selected[names.index(id_column)] = "{} * {} + {}".format(
+            id_column, buckets, bucket
+        )
+    cursor = connection.execute("SELECT {} FROM {}".format(", ".join(selected), table))
+    writer = csv.writer(out) if fmt == "csv" else None
+    if writer:
+        writer.writerow(names)
+
+    count = 0
+    while True:
+        rows = cursor.fetchmany(BATCH)
+        if not rows:
+            return count
+        for row in rows:
+            if writer:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(dict(zip(names, row))) + "\n")
+        count += len(rows)
+
+
+def read_rows(source: IO[str], fmt: str) -> Iterator[Dict]:
+    if fmt == "csv":
+        for row in csv.DictReader(source):
+            yield {key: value if value != "" else None for key, value in row.items()}
+    else:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+def import_table(
+    connection: sqlite3.Connection, table: str, rows: Iterable[Dict]
+) -> int:
+    """Insert or replace ``rows`` into ``table``, committing every batch."""
+    known = set(columns(table))
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = list(islice(rows, BATCH))
+        if not batch:
+            return count
+        names = [name for name in batch[0] if name in known]
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(
+                    table, ", ".join(names), ", ".join("?" * len(names))
+                ),
+                ([row.get(name) for name in names] for row in batch),
+            )
+        count += len(batch)
+
+
+def export_file(
+    database: str,
+    table: str,
+    path: str,
+    fmt: Optional[str] = None,
+    bucket: int = 0,
+    buckets: int = 1,
+):
+    connection = connect(database)
+    try:
+        with open(path, "w", newline="") as out:
+            return export_table(
+                connection, table, out, fmt_for(path, fmt), bucket, buckets
+            )
+    finally:
+        connection.close()
+
+
+def import_file(database: str, table: str, path: str, fmt: Optional[str] = None):
+    connection = connect(database)
+    try:
+        with open(path, newline="") as source:
+            return import_table(
+                connection, table, read_rows(source, fmt_for(path, fmt))
+            )
+    finally:
+        connection.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("backup", help="copy the database")
+    command.add_argument("database")
+    command.add_argument("target")
+
+    for name in ("export", "import"):
+        command = commands.add_parser(name, help="{} a table".format(name))
+        command.add_argument("database")
+        command.add_argument("table", choices=sorted(TABLES))
+        command.add_argument("path")
+        command.add_argument("--format", choices=["csv", "jsonl"])
+        if name == "export":
+            command.add_argument(
+                "--partition",
+                metavar="BUCKET/BUCKETS",
+                help="write game ids as the bot shows them, for one partition file",
+            )
+
+    arguments = parser.parse_args(argv)
+    if arguments.command == "backup":
+        result = backup(arguments.database, arguments.target)
+        print("Copied {pages} pages in {seconds:.2f}s".format(**result))
+    elif arguments.command == "export":
+        bucket, buckets = map(int, (arguments.partition or "0/1").split("/"))
+        count = export_file(
+            arguments.database,
+            arguments.table,
+            arguments.path,
+            arguments.format,
+            bucket,
+            buckets,
+        )
+        print("Exported {} rows".format(count))
+    else:
+        count = import_file(
+            arguments.database, arguments.table, arguments.path, arguments.format
+        )
+        print("Imported {} rows".format(count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+import math
+from itertools import islice
+from typing import Dict, List, Optional, Set
+
+
+def full_name(user) -> str:
+    return "{}#{}".format(user.name, user.discriminator)
+
+
+class GuildBans:
+    """The banned users of one guild, indexed by id and by ``name#discrim``."""
+
+    def __init__(self):
+        self.by_id: Dict[int, object] = {}
+        self.by_name: Dict[str, object] = {}
+        self.loaded = asyncio.Event()
+        self._unbanned: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def add(self, user):
+        self.by_id[user.id] = user
+        self.by_name[full_name(user)] = user
+        self._unbanned.discard(user.id)
+
+    def remove(self, user_id: int):
+        user = self.by_id.pop(user_id, None)
+        if user:
+            self.by_name.pop(full_name(user), None)
+        if not self.loaded.is_set():
+            self._unbanned.add(user_id)
+
+    def fill(self, users):
+        for user in users:
+            if user.id not in self._unbanned and user.id not in self.by_id:
+                self.add(user)
+        self._unbanned.clear()
+        self.loaded.set()
+
+    def pages(self, per_page: int) -> int:
+        return max(1, math.ceil(len(self.by_id) / per_page))
+
+    def page(self, number: int, per_page: int) -> List[object]:
+        start = (number - 1) * per_page
+        return list(islice(self.by_id.values(), start, start + per_page))
+
+
+class BanCache:
+    """Per-guild ban lists, downloaded once and then kept current from
+    ``on_member_ban``/``on_member_unban`` events."""
+
+    def __init__(self):
+        self._guilds: Dict[int, GuildBans] = {}
+
+    async def get(self, guild) -> GuildBans:
+        bans = self._guilds.get(guild.id)
+        if bans is None:
+            bans = self._guilds[guild.id] = GuildBans()
+            try:
+                bans.fill(entry.user for entry in await guild.bans())
+            except Exception:
+                del self._guilds[guild.id]
+                bans.loaded.set()
+                raise
+        await bans.loaded.wait()
+        if self._guilds.get(guild.id) is not bans:
+            return await self.get(guild)
+        return bans
+
+    def banned(self, guild_id: int, user):
+        if guild_id in self._guilds:
+            self._guilds[guild_id].add(user)
+
+    def unbanned(self, guild_id: int, user_id: int):
+        if guild_id in self._guilds:
+            self._guilds[guild_id].remove(user_id)
+
+    def forget(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    async def resolve(self, guild, name: str) -> Optional[object]:
+        return (await self.get(guild)).by_name.get(name)
+
+
+def render_page(users) -> str:
+    msg = "Username:{} ID:".format(7 * "\t")
+    for user in users:
+        name = full_name(user)
+        tab_space = 9 - math.floor(len(name) / 4)
+        msg += "\n{}{}{}".format(name, tab_space * "\t", user.id)
+    return msg
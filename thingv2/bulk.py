@@ -0,0 +1,101 @@
+import asyncio
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+TARGET = re.compile(r"<@!?(\d+)>|(\d{15,21})")
+
+
+def parse_targets(text: str) -> Tuple[List[int], str]:
+    """Split ``text`` into the user ids it starts with, as mentions or plain
+    ids, and the reason that follows them. Repeated ids are dropped."""
+    ids: Dict[int, None] = {}
+    words = text.split()
+    start = 0
+    for start, word in enumerate(words + [""]):
+        match = TARGET.fullmatch(word)
+        if not match:
+            break
+        ids[int(match.group(1) or match.group(2))] = None
+    return list(ids), " ".join(words[start:])
+
+
+def parse_id_list(text: str, limit: int) -> List[int]:
+    """The ids and mentions anywhere in ``text``, e.g. an uploaded file,
+    stopping at ``limit`` different ones."""
+    ids: Dict[int, None] = {}
+    for match in TARGET.finditer(text):
+        ids[int(match.group(1) or match.group(2))] = None
+        if len(ids) >= limit:
+            break
+    return list(ids)
+
+
+class BulkAction:
+    """Runs ``action`` for every target with at most ``concurrency`` calls in
+    flight, reporting progress at most once per ``interval`` seconds.
+
+    discord.py already waits out rate limits per route, so the semaphore only
+    keeps a large batch from queueing hundreds of requests at once.
+    """
+
+    def __init__(
+        self,
+        action: Callable[[int], Awaitable],
+        concurrency: int = 5,
+        interval: float = 2,
+        progress: Optional[Callable[["BulkAction"], Awaitable]] = None,
+    ):
+        self.action = action
+        self.concurrency = concurrency
+        self.interval = interval
+        self.progress = progress
+        self.total = 0
+        self.done: List[int] = []
+        self.failed: List[Tuple[int, str]] = []
+        self._reported = 0.0
+        self._reporting: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> int:
+        return len(self.done) + len(self.failed)
+
+    async def _one(self, semaphore: asyncio.Semaphore, target: int):
+        async with semaphore:
+            try:
+                await self.action(target)
+            except Exception as error:
+                self.failed.append((target, str(error) or type(error).__name__))
+            else:
+                self.done.append(target)
+        self._report()
+
+    def _report(self):
+        now = time.monotonic()
+        if not self.progress or now - self._reported < self.interval:
+            return
+        if self._reporting and not self._reporting.done():
+            return
+        self._reported = now
+        self._reporting = asyncio.ensure_future(self.progress(self))
+
+    async def run(self, targets: List[int]) -> "BulkAction":
+        self.total = len(targets)
+        self._reported = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._one(semaphore, target) for target in targets))
+        if self._reporting:
+            await asyncio.gather(self._reporting, return_exceptions=True)
+        return self
+
+    def summary(self, verb: str, limit: int = 20) -> str:
+        lines = ["{} {}/{} members.".format(verb, len(self.done), self.total)]
+        if self.failed:
+            lines.append("Failed for {}:".format(len(self.failed)))
+            lines.extend(
+                "`{}`: {}".format(target, error)
+                for target, error in self.failed[:limit]
+            )
+            if len(self.failed) > limit:
+                lines.append("and {} more.".format(len(self.failed) - limit))
+        return "\n".join(lines)
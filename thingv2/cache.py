@@ -0,0 +1,38 @@
+from collections import OrderedDict
+from typing import Iterable
+
+
+class KnownUsers:
+    """Bounded LRU set of user ids that are known to have an account row.
+
+    A hit means the ``users`` row exists and no database round trip is needed;
+    a miss only means the id has not been seen recently.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+
+    def __contains__(self, user_id: int) -> bool:
+        if user_id in self._ids:
+            self._ids.move_to_end(user_id)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, user_id: int):
+        self._ids[user_id] = None
+        self._ids.move_to_end(user_id)
+        if len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
+
+    def warm(self, user_ids: Iterable[int]):
+        for user_id in user_ids:
+            if len(self._ids) >= self.maxsize:
+                break
+            self._ids[user_id] = None
+
+    def discard(self, user_id: int):
+        self._ids.pop(user_id, None)
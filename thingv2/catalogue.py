@@ -0,0 +1,87 @@
+import inspect
+from typing import Any, Dict, List, Optional
+
+from discord.ext import commands
+
+from thingv2.embeds import Field
+
+
+def usage(command: commands.Command) -> str:
+    parts = []
+    for p_name, parameter in command.clean_params.items():
+        default = parameter.default
+        if default != inspect.Parameter.empty:
+            if default is None:
+                parts.append("[{}]".format(p_name))
+            else:
+                parts.append("[{} = {}]".format(p_name, default))
+        else:
+            parts.append("<{}>".format(p_name))
+    return " " + " ".join(parts) if parts else ""
+
+
+class CommandCatalogue:
+    """Help output for every command, built once and kept until the set of
+    cogs changes."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._overview: Optional[Dict[str, Any]] = None
+        self._details: Dict[str, Dict[str, Any]] = {}
+
+    def invalidate(self):
+        self._overview = None
+        self._details = {}
+
+    def build(self):
+        if self._overview is not None:
+            return
+
+        prefix = self.bot.command_prefix
+        for command in self.bot.commands:
+            command.usage = usage(command)
+            if not command.brief:
+                command.brief = "No description given."
+            if not command.help:
+                command.help = "No description given."
+
+            detail = dict(
+                title="{}{}{}".format(prefix, command.name, command.usage),
+                fields=[
+                    Field("Category", command.cog_name),
+                    Field(
+                        "Aliases",
+                        ", ".join(command.aliases) if command.aliases else "None",
+                    ),
+                    Field("Description", command.help, False),
+                ],
+            )
+            for name in [command.name] + list(command.aliases):
+                self._details[name] = detail
+
+        fields: List[Field] = []
+        for name, cog in self.bot.cogs.items():
+            cmd_info = [
+                "`{}{}{}` - {}".format(
+                    prefix, command.name, command.usage, command.brief
+                )
+                for command in cog.get_commands()
+                if not command.hidden
+            ]
+            if cmd_info:
+                fields.append(Field(name, "\n".join(cmd_info), False))
+
+        self._overview = dict(
+            message="Use `{}help [command]` for more information on a command. "
+            "`<>` arguments are compulsory and `[]` are optional.".format(prefix),
+            fields=fields,
+            title="Here's a list of commands!",
+        )
+
+    def overview(self) -> Dict[str, Any]:
+        self.build()
+        return self._overview
+
+    def detail(self, name: str) -> Optional[Dict[str, Any]]:
+        self.build()
+        return self._details.get(name)
@@ -0,0 +1,126 @@
+import asyncio
+import multiprocessing
+import time
+from typing import Any, Dict, List
+
+# A cluster that dies sooner than this after starting is restarted with a
+# growing delay instead of straight away.
+MIN_UPTIME = 60
+MAX_BACKOFF = 300
+
+
+async def recommended_shards(token: str) -> int:
+    from discord.http import HTTPClient
+
+    http = HTTPClient()
+    try:
+        await http.static_login(token, bot=True)
+        shards, _ = await http.get_bot_gateway()
+    finally:
+        await http.close()
+    return shards
+
+
+def split(shard_count: int, clusters: int) -> List[List[int]]:
+    """Deal ``shard_count`` shard ids out over at most ``clusters`` groups."""
+    clusters = max(1, min(clusters, shard_count))
+    return [list(range(shard_count))[i::clusters] for i in range(clusters)]
+
+
+def cluster_config(config: Dict[str, Any], index: int) -> Dict[str, Any]:
+    config = dict(config)
+    for name in ("write_behind", "ledger"):
+        if config.get(name):
+            # Balances cached in one process would go stale as soon as another
+            # process updates the same user, so every cluster writes through.
+            print("Cluster {}: {} disabled when clustered".format(index, name))
+            config[name] = None
+    # Other clusters change balances too, so re-read them now and then.
+    config.setdefault("leaderboard_refresh", 60)
+    if config.get("metrics_file"):
+        config["metrics_file"] = "{}.{}".format(config["metrics_file"], index)
+    return config
+
+
+def run_cluster(config: Dict[str, Any], shard_ids: List[int], shard_count: int):
+    from thingv2.index import create_bot
+
+    bot = create_bot(
+        config,
+        config.get("database", "sqlite:///economy"),
+        shard_ids=shard_ids,
+        shard_count=shard_count,
+    )
+    try:
+        bot.run(config["token"])
+    finally:
+        bot.shutdown()
+
+
+def launch(config: Dict[str, Any]):
+    """Run the bot as ``config["clusters"]`` processes, each owning a group of
+    shards.
+
+    Every process opens its own connections to the database. The schema is
+    migrated here first so the clusters never race each other on it; after
+    that SQLite's WAL mode and ``busy_timeout`` serialise their writes.
+    """
+    from thingv2.partitions import open_database
+    from thingv2.schema import bootstrap
+
+    shard_count = config.get("shard_count") or asyncio.run(
+        recommended_shards(config["token"])
+    )
+    groups = split(shard_count, config.get("clusters", 1))
+
+    if config.get("storage", "sqlite") == "sqlite":
+        database = open_database(config.get("database", "sqlite:///economy"), config)
+        try:
+            bootstrap(database)
+        finally:
+            database.close()
+
+    context = multiprocessing.get_context("spawn")
+
+    def start(index: int) -> multiprocessing.Process:
+        process = context.Process(
+            target=run_cluster,
+            args=(cluster_config(config, index), groups[index], shard_count),
+            name="thingv2-cluster-{}".format(index),
+        )
+        process.start()
+        print(
+            "Cluster {} started with shards {} of {}".format(
+                index, groups[index], shard_count
+            )
+        )
+        return process
+
+    processes = [start(index) for index in range(len(groups))]
+    started = [time.monotonic()] * len(processes)
+    backoff = [1.0] * len(processes)
+    try:
+        while True:
+            for index, process in enumerate(processes):
+                process.join(timeout=1 / len(processes))
+                if process.exitcode is None:
+                    continue
+                if process.exitcode == 0:
+                    return
+                if time.monotonic() - started[index] > MIN_UPTIME:
+                    backoff[index] = 1.0
+                print(
+                    "Cluster {} exited with {}, restarting in {:g}s".format(
+                        index, process.exitcode, backoff[index]
+                    )
+                )
+                time.sleep(backoff[index])
+                backoff[index] = min(backoff[index] * 2, MAX_BACKOFF)
+                processes[index] = start(index)
+                started[index] = time.monotonic()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
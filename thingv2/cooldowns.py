@@ -0,0 +1,54 @@
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+
+class Cooldowns:
+    """When each user last used a command, kept for as long as it matters.
+
+    A heap of ``(used at, user id)`` finds the entries whose cooldown has run
+    out so they can be dropped as new ones come in; outdated heap entries are
+    skipped. Resetting everyone's cooldown only moves ``epoch``: anything
+    recorded before it no longer counts. Other processes can move the epoch
+    too, so it should be read again once it is ``epoch_ttl`` seconds old.
+    """
+
+    def __init__(self, cooldown: int, epoch_ttl: int = 30):
+        self.cooldown = cooldown
+        self.epoch_ttl = epoch_ttl
+        self.epoch: Optional[int] = None
+        self._epoch_read = 0
+        self._used: Dict[int, int] = {}
+        self._expiry: List[Tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._used)
+
+    def epoch_stale(self, now: int) -> bool:
+        return self.epoch is None or now - self._epoch_read >= self.epoch_ttl
+
+    def set_epoch(self, epoch: int, now: int):
+        self.epoch = epoch
+        self._epoch_read = now
+
+    def remaining(self, user_id: int, now: int) -> int:
+        """Seconds left on ``user_id``'s cooldown, or 0 when it is not known
+        to be running."""
+        used = self._used.get(user_id)
+        if used is None or used < (self.epoch or 0):
+            return 0
+        return max(0, used + self.cooldown - now)
+
+    def used(self, user_id: int, at: int, now: int):
+        if at + self.cooldown <= now:
+            self._used.pop(user_id, None)
+        elif self._used.get(user_id) != at:
+            self._used[user_id] = at
+            heapq.heappush(self._expiry, (at, user_id))
+
+        while self._expiry and self._expiry[0][0] + self.cooldown <= now:
+            expired, first = heapq.heappop(self._expiry)
+            if self._used.get(first) == expired:
+                del self._used[first]
+
+    def reset(self, now: int):
+        self.set_epoch(now, now)
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+# Discord limits embed descriptions to 2048 characters.
+DESCRIPTION_LIMIT = 2048
+
+
+class Dispatcher:
+    """Per-channel outbound queue for embeds.
+
+    Each channel gets its own queue and worker, so a busy channel only delays
+    its own replies. Sends are paced to at most ``rate`` messages per ``per``
+    seconds per channel, which keeps the bot under Discord's per-channel
+    bucket instead of running into 429s. With ``coalesce`` enabled, queued
+    description-only embeds for the same channel are merged into one message.
+    """
+
+    def __init__(self, rate: int = 5, per: float = 5.0, coalesce: bool = False):
+        self.rate = rate
+        self.per = per
+        self.coalesce = coalesce
+        self.sent = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self._queues: Dict[int, Deque[Tuple[Any, bool, asyncio.Future]]] = {}
+        self._history: Dict[int, Deque[float]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+
+    def metrics(self) -> Dict[str, int]:
+        return dict(
+            queued=sum(len(queue) for queue in self._queues.values()),
+            channels=len(self._workers),
+            max_depth=self.max_depth,
+            sent=self.sent,
+            coalesced=self.coalesced,
+        )
+
+    async def send(self, destination, embed, coalesce: bool = True):
+        channel_id = destination.channel.id
+        future = asyncio.get_event_loop().create_future()
+        queue = self._queues.setdefault(channel_id, deque())
+        queue.append((embed, coalesce, future))
+        self.max_depth = max(self.max_depth, len(queue))
+
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.ensure_future(
+                self._drain(channel_id, destination)
+            )
+        return await future
+
+    async def _wait_for_slot(self, channel_id: int):
+        history = self._history.setdefault(channel_id, deque())
+        while history and history[0] <= time.monotonic() - self.per:
+            history.popleft()
+        if len(history) >= self.rate:
+            await asyncio.sleep(history[0] + self.per - time.monotonic())
+            history.popleft()
+        history.append(time.monotonic())
+
+    @staticmethod
+    def _mergeable(embed) -> bool:
+        keys = set(embed.to_dict())
+        return "description" in keys and keys <= {"description", "color", "type"}
+
+    def _take_batch(self, queue) -> Tuple[Any, List[asyncio.Future]]:
+        embed, coalesce, future = queue.popleft()
+        futures = [future]
+        if not (self.coalesce and coalesce and self._mergeable(embed)):
+            return embed, futures
+
+        descriptions = [embed.description]
+        length = len(embed.description)
+        while queue:
+            following, coalesce, future = queue[0]
+            if not (coalesce and self._mergeable(following)):
+                break
+            length += len(following.description) + 2
+            if length > DESCRIPTION_LIMIT:
+                break
+            queue.popleft()
+            descriptions.append(following.description)
+            futures.append(future)
+
+        if len(futures) > 1:
+            embed = embed.copy()
+            embed.description = "\n\n".join(descriptions)
+            self.coalesced += len(futures) - 1
+        return embed, futures
+
+    async def _drain(self, channel_id: int, destination):
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                await self._wait_for_slot(channel_id)
+                embed, futures = self._take_batch(queue)
+                try:
+                    message = await destination.send(embed=embed)
+                except Exception as error:
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(error)
+                else:
+                    self.sent += 1
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(message)
+        finally:
+            del self._workers[channel_id]
+            if not queue:
+                del self._queues[channel_id]
+            asyncio.get_event_loop().call_later(self.per, self._forget, channel_id)
+
+    def _forget(self, channel_id: int):
+        if channel_id not in self._workers:
+            self._history.pop(channel_id, None)
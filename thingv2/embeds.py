@@ -0,0 +1,8 @@
+from dataclasses import dataclass
+
+
+@dataclass()
+class Field:
+    name: str
+    value: str
+    inline: bool = True
@@ -1,32 +1,286 @@
+import asyncio
 import colorsys
-import inspect
-import json
 import math
+import os
 import random
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, Tuple
 import time
-import dataset
-from dataclasses import dataclass
-from dataset import Table
-from discord import Message, Embed, Member
+import tracemalloc
+from discord import HTTPException, Message, Embed, Member, Object
 from discord.ext import commands
 from discord.ext.commands import Context
 
-with open("config.json") as f:
-    config = json.load(f)
+from thingv2 import backup, memory
+from thingv2.accounts import Accounts
+from thingv2.backends import Storage, open_storage
+from thingv2.bans import BanCache, render_page
+from thingv2.bulk import BulkAction, parse_id_list, parse_targets
+from thingv2.cache import KnownUsers
+from thingv2.catalogue import CommandCatalogue
+from thingv2.cooldowns import Cooldowns
+from thingv2.dispatch import Dispatcher
+from thingv2.embeds import Field
+from thingv2.leaderboard import BOARDS, Leaderboard
+from thingv2.metrics import Metrics, current_command
+from thingv2.storage import Database
+from thingv2.tictactoe import DIFFICULTIES, Game, GameIndex, choose_move, perfect_moves
+
+PREFIX = "t$"
+BANS_PER_PAGE = 20
+LEADERBOARD_PER_PAGE = 10
+CLAIM_COOLDOWN = 86400
+
+
+class Bot(commands.AutoShardedBot):
+    """The bot plus the resources its cogs share.
+
+    Nothing touches the database until it is first used, so a bot can be
+    created, inspected and driven in-process without a connection to Discord.
+    Without ``shard_count``/``shard_ids`` the bot asks Discord how many shards
+    to run and runs all of them; :mod:`thingv2.cluster` spreads them over
+    several processes instead.
+    """
+
+    def __init__(self, config: Dict[str, Any], db_url: str, **options):
+        # Adding the default help command already invalidates the catalogue.
+        self.catalogue = CommandCatalogue(self)
+        super().__init__(**options)
+        self.config = config
+        self.db_url = db_url
+        self.known_users = KnownUsers(config.get("known_users_cache", 100000))
+        self.dispatcher = Dispatcher(**config.get("dispatch", {}))
+        self.metrics = Metrics()
+        memory.start_tracing(config)
+        self.leaderboard = Leaderboard()
+        self.claims = Cooldowns(CLAIM_COOLDOWN)
+        self._leaderboard_loading: Optional[asyncio.Future] = None
+        self._leaderboard_loaded = 0.0
+        self._storage: Optional[Storage] = None
+        self._metrics_task: Optional[asyncio.Task] = None
+
+        self.before_invoke(self.start_command)
+        self.after_invoke(self.finish_command)
+        request = self.http.request
+
+        async def timed_request(route, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await request(route, **kwargs)
+            finally:
+                self.metrics.observe_http(
+                    "{} {}".format(route.method, route.path),
+                    time.perf_counter() - started,
+                )
+
+        self.http.request = timed_request
+
+    def _use_storage(self, storage: Storage):
+        if self._storage is None:
+            storage.accounts.observer = self.leaderboard.update
+            self._storage = storage
+        elif storage is not self._storage:
+            storage.close()
+
+    async def prepare_storage(self):
+        """Open the storage on an executor thread: migrating the schema,
+        replaying a journal or snapshotting the ledger would otherwise block
+        the event loop."""
+        if self._storage is None:
+            self._use_storage(
+                await asyncio.get_event_loop().run_in_executor(
+                    None,
+                    open_storage,
+                    self.db_url,
+                    self.config,
+                    self.metrics.observe_database,
+                )
+            )
+
+    async def start(self, *args, **kwargs):
+        await self.prepare_storage()
+        await super().start(*args, **kwargs)
+
+    @property
+    def storage(self) -> Storage:
+        """Opened by :meth:`start` before connecting; only a bot driven
+        in-process opens it here, on first use."""
+        if self._storage is None:
+            self._use_storage(
+                open_storage(self.db_url, self.config, self.metrics.observe_database)
+            )
+        return self._storage
+
+    @property
+    def database(self) -> Optional[Database]:
+        """The SQLite database, or ``None`` with another storage backend."""
+        return getattr(self.storage, "database", None)
+
+    @property
+    def games(self):
+        return self.storage.games
+
+    @property
+    def accounts(self) -> Accounts:
+        return self.storage.accounts
+
+    def add_cog(self, cog):
+        super().add_cog(cog)
+        self.catalogue.invalidate()
+
+    def remove_cog(self, name):
+        super().remove_cog(name)
+        self.catalogue.invalidate()
+
+    def add_command(self, command):
+        super().add_command(command)
+        self.catalogue.invalidate()
+
+    def remove_command(self, name):
+        command = super().remove_command(name)
+        self.catalogue.invalidate()
+        return command
+
+    async def start_command(self, ctx):
+        ctx.started = time.perf_counter()
+        current_command.set(ctx.command.qualified_name)
+
+    async def finish_command(self, ctx):
+        self.metrics.observe_command(
+            ctx.command.qualified_name, time.perf_counter() - ctx.started
+        )
+
+    def update_gauges(self):
+        for name, value in self.dispatcher.metrics().items():
+            self.metrics.gauges["dispatch_{}".format(name)] = value
+        self.metrics.gauges["known_users"] = len(self.known_users)
+        self.metrics.gauges["rss_bytes"] = memory.rss()
+        for shard_id, latency in self.latencies:
+            self.metrics.gauges["shard_{}_latency_seconds".format(shard_id)] = latency
+
+    async def write_metrics(self, path: str, interval: float):
+        while True:
+            self.update_gauges()
+            try:
+                self.metrics.write(path)
+            except OSError as error:
+                print("Could not write metrics:", error)
+            await asyncio.sleep(interval)
+
+    async def _read_leaderboard(self, refresh: bool):
+        # Open the storage first so changes made while the rows are being
+        # read already reach the leaderboard.
+        storage = self.storage
+        if refresh:
+            self.leaderboard.start_refresh()
+            self.leaderboard.refresh(await storage.balances())
+        else:
+            self.leaderboard.load(
+                *await asyncio.gather(storage.balances(), storage.members())
+            )
+        self._leaderboard_loaded = time.monotonic()
+
+    async def load_leaderboard(self):
+        """Load the rankings once. With ``leaderboard_refresh`` set, which
+        clusters do, balances older than that many seconds are read again,
+        since other processes change them too."""
+        refresh = self.config.get("leaderboard_refresh")
+        loading = self._leaderboard_loading
+        if loading is None:
+            loading = asyncio.ensure_future(self._read_leaderboard(False))
+        elif (
+            refresh
+            and loading.done()
+            and time.monotonic() - self._leaderboard_loaded > refresh
+        ):
+            loading = asyncio.ensure_future(self._read_leaderboard(True))
+        self._leaderboard_loading = loading
+        try:
+            await loading
+        except Exception:
+            # Read everything again on the next call rather than failing
+            # forever.
+            if self._leaderboard_loading is loading:
+                self._leaderboard_loading = None
+            raise
+
+    async def provision(self, user, guild=None):
+        if user.id not in self.known_users:
+            await self.storage.add_user(user.id, user.name)
+            self.known_users.add(user.id)
+
+        if guild is not None and not self.leaderboard.is_member(guild.id, user.id):
+            await self.storage.add_member(guild.id, user.id)
+            self.leaderboard.join(guild.id, user.id)
+
+    def owns_guild(self, guild_id: int) -> bool:
+        """Whether ``guild_id`` is on one of this process's shards."""
+        if not self.shard_ids or not self.shard_count:
+            return True
+        return (guild_id >> 22) % self.shard_count in self.shard_ids
+
+    async def on_shard_ready(self, shard_id: int):
+        print("Shard {} of {} ready".format(shard_id, self.shard_count))
+
+    async def on_ready(self):
+        self.catalogue.build()
+
+        if not self.known_users:
+            self.known_users.warm(await self.storage.user_ids(self.known_users.maxsize))
+
+        self.storage.start()
+        await self.load_leaderboard()
+
+        if self.config.get("metrics_file") and not self._metrics_task:
+            self._metrics_task = self.loop.create_task(
+                self.write_metrics(
+                    self.config["metrics_file"], self.config.get("metrics_interval", 15)
+                )
+            )
+
+        print("Logged on as", self.user)
+
+    async def on_message(self, message):
+        if message.author == self.user:
+            return
+
+        await self.provision(message.author, message.guild)
+
+        if self.is_ready():
+            await self.process_commands(message)
+
+    async def on_command_error(self, ctx, error):
+        error = getattr(error, "original", error)
+        self.metrics.error(ctx.command.qualified_name if ctx.command else "-", error)
+
+        if isinstance(error, commands.UserInputError):
+            error_msg = str(error).split(" ")
+            arg = error_msg.pop(0)
+            await send_embed(
+                ctx,
+                "`<{}>` {}".format(arg, " ".join(error_msg)),
+                title="Missing argument",
+                colour="ff0000",
+                footer="Use !help {} for more information.".format(ctx.command.name),
+            )
 
-bot = commands.Bot(command_prefix="t$", help_command=None)
+        if isinstance(error, ValueError):
+            await send_embed(ctx, "You must enter an integer.", colour="ff0000")
 
-db = dataset.connect("sqlite:///economy")
-users: Table = db["users"]
-games: Table = db["ttt_games"]
+        if isinstance(error, commands.MissingPermissions):
+            await send_embed(
+                ctx, str(error), colour="ff0000", title="Missing permissions"
+            )
+
+    def shutdown(self):
+        if self._storage is not None:
+            self._storage.close()
 
 
-@dataclass()
-class Field:
-    name: str
-    value: str
-    inline: bool = True
+def ignore_http_errors(task: asyncio.Future):
+    """Done callback for requests whose failure does not matter, such as
+    deleting a command message that is already gone."""
+    if not task.cancelled() and not isinstance(task.exception(), HTTPException):
+        task.result()
 
 
 async def send_embed(
@@ -38,6 +292,7 @@ async def send_embed(
     image: Optional[str] = None,
     thumbnail: Optional[str] = None,
     fields: Optional[List[Field]] = None,
+    coalesce: bool = True,
 ) -> Message:
     hue, sat, light = (random.random(), 0.6, 0.5)
     red, green, blue = [int(255 * i) for i in colorsys.hls_to_rgb(hue, light, sat)]
@@ -57,66 +312,7 @@ async def send_embed(
         for field in fields:
             embed.add_field(name=field.name, value=field.value, inline=field.inline)
 
-    return await ctx.send(embed=embed)
-
-
-@bot.event
-async def on_ready():
-    for command in bot.commands:
-        usage = []
-        for p_name, parameter in command.clean_params.items():
-            default = parameter.default
-            if default != inspect.Parameter.empty:
-                if default is None:
-                    usage.append("[{}]".format(p_name))
-                else:
-                    usage.append("[{} = {}]".format(p_name, default))
-            else:
-                usage.append("<{}>".format(p_name))
-        command.usage = " " + " ".join(usage) if usage else ""
-
-        if not command.brief:
-            command.brief = "No description given."
-
-        if not command.help:
-            command.help = "No description given."
-
-    print("Logged on as", bot.user)
-
-
-@bot.event
-async def on_message(message):
-    if message.author == bot.user:
-        return
-
-    row = users.find_one(id=message.author.id)
-    if not row:
-        users.insert(dict(id=message.author.id, nick=message.author.name, balance=0))
-
-    if bot.is_ready():
-        await bot.process_commands(message)
-
-
-@bot.event
-async def on_command_error(ctx, error):
-    error = getattr(error, "original", error)
-
-    if isinstance(error, commands.UserInputError):
-        error_msg = str(error).split(" ")
-        arg = error_msg.pop(0)
-        await send_embed(
-            ctx,
-            "`<{}>` {}".format(arg, " ".join(error_msg)),
-            title="Missing argument",
-            colour="ff0000",
-            footer="Use !help {} for more information.".format(ctx.command.name),
-        )
-
-    if isinstance(error, ValueError):
-        await send_embed(ctx, "You must enter an integer.", colour="ff0000")
-
-    if isinstance(error, commands.MissingPermissions):
-        await send_embed(ctx, str(error), colour="ff0000", title="Missing permissions")
+    return await ctx.bot.dispatcher.send(ctx, embed, coalesce)
 
 
 class Miscellaneous(commands.Cog):
@@ -177,56 +373,19 @@ class Miscellaneous(commands.Cog):
     async def help(self, ctx: Context, cmd: Optional[str] = None):
 
         if cmd:
-            command = bot.get_command(cmd)
-            if not command:
+            detail = self.bot.catalogue.detail(cmd)
+            if not detail:
                 await send_embed(
                     ctx,
                     "That command does not exist. Make sure you typed it in correctly!",
-                    footer="Use {}help to view a list of commands!".format(
-                        bot.command_prefix
-                    ),
+                    footer="Use {}help to view a list of commands!".format(PREFIX),
                     title="Invalid input.",
                     colour="ff0000",
                 )
             else:
-                await send_embed(
-                    ctx,
-                    title="{}{}{}".format(
-                        bot.command_prefix, command.name, command.usage
-                    ),
-                    fields=[
-                        Field("Category", command.cog_name),
-                        Field(
-                            "Aliases",
-                            ", ".join(command.aliases) if command.aliases else "None",
-                        ),
-                        Field("Description", command.help, False),
-                    ],
-                )
+                await send_embed(ctx, **detail)
         else:
-            fields = []
-            for name, cog in bot.cogs.items():
-                cmd_info = []
-                for command in cog.get_commands():
-                    if command.hidden:
-                        continue
-                    cmd_info.append(
-                        "`{}{}{}` - {}".format(
-                            bot.command_prefix,
-                            command.name,
-                            command.usage,
-                            command.brief,
-                        )
-                    )
-                cmd_info = "\n".join(cmd_info)
-                fields.append(Field(name, cmd_info, False))
-            await send_embed(
-                ctx,
-                "Use `{}help [command]` for more information on a command. `<>` arguments are compulsory and `[]` are "
-                "optional.".format(bot.command_prefix),
-                fields=fields,
-                title="Here's a list of commands!",
-            )
+            await send_embed(ctx, **self.bot.catalogue.overview())
 
 
 class Economy(commands.Cog):
@@ -239,29 +398,27 @@ class Economy(commands.Cog):
         help="Used to check your balance. Shows the amount of money you currently own.",
     )
     async def bal(self, ctx: Context):
-        row = users.find_one(id=ctx.author.id)
+        account = await self.bot.accounts.get(ctx.author.id)
         await send_embed(
             ctx,
             title="{}'s balance".format(ctx.author.name),
             fields=[
-                Field("Balance", "**£{}**".format(row["balance"])),
-                Field("In bank", "**£{}**".format(row["bank"])),
+                Field("Balance", "**£{}**".format(account.balance)),
+                Field("In bank", "**£{}**".format(account.bank)),
             ],
             thumbnail="https://emojipedia-us.s3.dualstack.us-west-1.amazonaws.com/thumbs/120/facebook/65/money"
             "-bag_1f4b0.png",
-            footer="You have £{} in total.".format(row["balance"] + row["bank"]),
+            footer="You have £{} in total.".format(account.balance + account.bank),
         )
 
     @commands.command(aliases=["add", "add_money"], hidden=True)
     @commands.is_owner()
     async def gain(self, ctx: Context, amount):
-        row = users.find_one(id=ctx.author.id)
-        new_bal = row["balance"] + int(amount)
-        users.update(dict(id=ctx.author.id, balance=new_bal), ["id"])
+        account = await self.bot.accounts.credit(ctx.author.id, int(amount))
         await send_embed(
             ctx,
             "{}, I have added **£{}** to your account\nNew balance: **£{}**".format(
-                ctx.author.name, amount, new_bal
+                ctx.author.name, amount, account.balance
             ),
         )
 
@@ -271,31 +428,32 @@ class Economy(commands.Cog):
         "A roll over 50 (excluding) is a win",
     )
     async def gamble(self, ctx: Context, amount):
-        row = users.find_one(id=ctx.author.id)
+        if int(amount) < 5:
+            await send_embed(ctx, "Minimum bet is <:messMoney:440105828758978590>5")
+            return
+
+        num = random.randint(1, 100)
+        if num <= 50:
+            account = await self.bot.accounts.debit(ctx.author.id, int(amount))
+            msg = "Unfortunately you rolled **{}**. You lost **£{}**".format(
+                num, amount
+            )
+        else:
+            account = await self.bot.accounts.credit(
+                ctx.author.id, int(amount), stake=int(amount)
+            )
+            msg = "Congrats! you rolled **{}**. You won **£{}**".format(num, amount)
 
-        if int(amount) > row["balance"]:
+        if not account:
+            account = await self.bot.accounts.get(ctx.author.id)
             await send_embed(
                 ctx,
                 "You cannot gamble more than you have.\nBalance: £{}".format(
-                    row["balance"]
+                    account.balance
                 ),
             )
-        elif int(amount) < 5:
-            await send_embed(ctx, "Minimum bet is <:messMoney:440105828758978590>5")
         else:
-            num = random.randint(1, 100)
-            new_bal = row["balance"]
-            if num <= 50:
-                new_bal -= int(amount)
-                msg = "Unfortunately you rolled **{}**. You lost **£{}**".format(
-                    num, amount
-                )
-            else:
-                new_bal += int(amount)
-                msg = "Congrats! you rolled **{}**. You won **£{}**".format(num, amount)
-
-            users.update(dict(id=ctx.author.id, balance=new_bal), ["id"])
-            await send_embed(ctx, "{}\nBalance: **£{}**".format(msg, new_bal))
+            await send_embed(ctx, "{}\nBalance: **£{}**".format(msg, account.balance))
 
     @commands.command(
         brief="Claim some money each day!",
@@ -303,10 +461,26 @@ class Economy(commands.Cog):
         aliases=["daily"],
     )
     async def claim(self, ctx: Context):
-        row = users.find_one(id=ctx.author.id)
+        claims = self.bot.claims
+        money = random.randint(100, 500)
+        now = int(time.time())
+        if claims.epoch_stale(now):
+            claims.set_epoch(await self.bot.accounts.claim_epoch(), now)
+        seconds = claims.remaining(ctx.author.id, now)
+        if not seconds:
+            account = await self.bot.accounts.claim(
+                ctx.author.id, money, now, claims.cooldown, claims.epoch
+            )
+            if account:
+                claims.used(ctx.author.id, now, now)
+            else:
+                account = await self.bot.accounts.get(ctx.author.id)
+                if not account:
+                    return
+                claims.used(ctx.author.id, account.claim_cd, now)
+                seconds = max(1, claims.remaining(ctx.author.id, now))
 
-        if int(time.time()) < row["claim_cd"] + 86400:
-            seconds = 86400 - (int(time.time()) - row["claim_cd"])
+        if seconds:
             hours = math.floor(seconds / 3600)
             seconds -= hours * 3600
             minutes = math.floor(seconds / 60)
@@ -322,8 +496,6 @@ class Economy(commands.Cog):
                 "-clock_23f0.png ",
             )
         else:
-            money = random.randint(100, 500)
-            new_bal = row["balance"] + money
             responses = [
                 "You beat up a poor homeless man and stole his lunch money, no regrets were made as you cashed out "
                 "**£{}**. Why'd he have so much money the damn hoarder.",
@@ -333,10 +505,6 @@ class Economy(commands.Cog):
                 "kidnapped by the fucking Italian Mafia and they sauced you **£{}** in exchange for your loyalty.",
                 "You literally sucked dick for money. He paid you **£{}**. Money is money right...",
             ]
-            users.update(
-                dict(id=ctx.author.id, balance=new_bal, claim_cd=int(time.time())),
-                ["id"],
-            )
             await send_embed(
                 ctx,
                 random.choice(responses).format(money)
@@ -352,12 +520,13 @@ class Economy(commands.Cog):
         aliases=["dep"],
     )
     async def deposit(self, ctx: Context, amount: int):
-        row = users.find_one(id=ctx.author.id)
-        if amount > row["balance"]:
+        account = await self.bot.accounts.deposit(ctx.author.id, amount)
+        if not account:
+            account = await self.bot.accounts.get(ctx.author.id)
             await send_embed(
                 ctx,
                 "You cannot deposit more than you own.\nBalance: **£{}**".format(
-                    row["balance"]
+                    account.balance
                 ),
                 title="Deposit failed.",
                 colour="ff0000",
@@ -365,15 +534,10 @@ class Economy(commands.Cog):
                 "-mark_274c.png",
             )
         else:
-            new_bal = row["balance"] - amount
-            new_banked = row["bank"] + amount
-            users.update(
-                dict(id=ctx.author.id, bank=new_banked, balance=new_bal,), ["id"],
-            )
             await send_embed(
                 ctx,
                 "Successfully deposited **£{}** to your bank account!\nBalance: **£{}**\nMoney in bank: **£{}**".format(
-                    amount, new_bal, new_banked
+                    amount, account.balance, account.bank
                 ),
                 title="Money deposited!",
                 thumbnail="https://emojipedia-us.s3.dualstack.us-west-1.amazonaws.com/thumbs/120/facebook/65"
@@ -386,238 +550,509 @@ class Economy(commands.Cog):
         aliases=["wd"],
     )
     async def withdraw(self, ctx: Context, amount: int):
-        row = users.find_one(id=ctx.author.id)
-        if amount > row["bank"]:
+        account = await self.bot.accounts.withdraw(ctx.author.id, amount)
+        if not account:
+            account = await self.bot.accounts.get(ctx.author.id)
             await send_embed(
                 ctx,
                 "You cannot withdraw more than you have in the bank.\nMoney in bank: **£{}**".format(
-                    row["bank"]
+                    account.bank
                 ),
                 title="Withdraw failed.",
                 colour="ff0000",
             )
         else:
-            new_bal = row["balance"] + amount
-            new_banked = row["bank"] - amount
-            users.update(
-                dict(id=ctx.author.id, bank=new_banked, balance=new_bal), ["id"],
-            )
             await send_embed(
                 ctx,
                 "Successfully withdrew **£{}** from your bank account!"
                 "\nBalance: **£{}**"
-                "\nMoney in bank: **£{}**".format(amount, new_bal, new_banked),
+                "\nMoney in bank: **£{}**".format(
+                    amount, account.balance, account.bank
+                ),
                 title="Money withdrawn!",
                 thumbnail="https://emojipedia-us.s3.dualstack.us-west-1.amazonaws.com/thumbs/120/facebook/65/upwards"
                 "-black-arrow_2b06.png",
             )
 
+    @commands.command(
+        brief="See the richest users!",
+        aliases=["lb", "top"],
+        help="Shows the richest users in this server, or everywhere with `global`. "
+        "The board can be wallet, bank or total. Give any of them and a page "
+        "number in any order, e.g. `{}lb global bank 2`.".format(PREFIX),
+    )
+    async def leaderboard(self, ctx: Context, *options: str):
+        board, scope, page = "total", "server", 1
+        for option in options:
+            option = option.lower()
+            if option in BOARDS:
+                board = option
+            elif option in ("server", "global"):
+                scope = option
+            elif option.isdigit():
+                page = int(option)
+            else:
+                await send_embed(
+                    ctx,
+                    "Use a board ({}), `server` or `global` and a page number.".format(
+                        ", ".join(BOARDS)
+                    ),
+                    colour="ff0000",
+                )
+                return
+
+        await self.bot.load_leaderboard()
+        guild_id = ctx.guild.id if ctx.guild and scope != "global" else None
+        ranking = self.bot.leaderboard.board(board, guild_id)
+        pages = ranking.pages(LEADERBOARD_PER_PAGE)
+        page = min(max(page, 1), pages)
+        start = (page - 1) * LEADERBOARD_PER_PAGE
+        lines = [
+            "**{}.** <@{}> £{}".format(start + i, user_id, value)
+            for i, (user_id, value) in enumerate(
+                ranking.page(page, LEADERBOARD_PER_PAGE), 1
+            )
+        ]
+        rank = ranking.rank(ctx.author.id)
+        await send_embed(
+            ctx,
+            "\n".join(lines) or "Nobody has any money yet.",
+            title="{} leaderboard ({})".format(
+                board.capitalize(), "server" if guild_id else "global"
+            ),
+            footer="Page {} of {}. {}".format(
+                page,
+                pages,
+                "You are #{}.".format(rank) if rank else "You are not ranked yet.",
+            ),
+        )
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.bot.leaderboard.leave(member.guild.id, member.id)
+        await self.bot.storage.remove_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.bot.leaderboard.forget_guild(guild.id)
+        await self.bot.storage.forget_guild(guild.id)
+
     @commands.command()
     @commands.is_owner()
     async def rc(self, ctx):
-        db.query("UPDATE users SET claim_cd = 0")
+        now = int(time.time())
+        await self.bot.accounts.reset_claims(now)
+        self.bot.claims.reset(now)
 
 
 class Games(commands.Cog):
     def __init__(self, client):
         self.bot = client
+        self.index = GameIndex()
+        self._loading: Optional[asyncio.Future] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        self.board_messages: Dict[int, Message] = {}
+        self.pending_edits: Dict[int, bool] = {}
+
+        settings = client.config.get("ttt", {})
+        self.ttl = settings.get("ttl", 3600)
+        self.sweep_interval = settings.get("sweep_interval", 60)
+        self.reaped = 0
+        perfect_moves()
+
+    async def load_index(self):
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self.bot.games.find())
+            try:
+                rows = await self._loading
+            except Exception:
+                self._loading = None
+                raise
+            # Other clusters keep track of the games in their own guilds.
+            self.index.load(
+                (row for row in rows if self.bot.owns_guild(row["guild_id"])),
+                int(time.time()),
+            )
+            self._sweeper = asyncio.ensure_future(self.sweep_forever())
+        else:
+            await self._loading
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Loading the index starts the sweeper, which would otherwise wait for
+        # the first game command after a restart.
+        await self.load_index()
+
+    def cog_unload(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+
+    async def sweep(self, now: Optional[int] = None) -> int:
+        """End every game without a move in the last ``ttl`` seconds."""
+        now = now or int(time.time())
+        cutoff = now - self.ttl
+        games = self.index.expired(cutoff)
+        if not games:
+            return 0
+
+        # Only delete rows that are still idle, and keep any game the database
+        # has seen a move in since the index last did.
+        ids = [game.game_id for game in games]
+        await self.bot.games.delete(game_id=ids, last_active={"<=": cutoff})
+        live = {row["game_id"]: row for row in await self.bot.games.find(game_id=ids)}
+
+        ended = []
+        for game in games:
+            if self.index.get(game.game_id) is not game:
+                # Finished or ended by the players in the meantime.
+                continue
+            if game.last_active > cutoff:
+                # Moved in while the sweep was running. The move may have
+                # found its row already deleted, so the game is saved again.
+                if game.game_id not in live:
+                    await self.bot.games.insert(game.to_row())
+            elif game.game_id in live:
+                self.index.touch(game, live[game.game_id]["last_active"])
+            else:
+                self.forget(game)
+                ended.append(game)
+        games = ended
+        if not games:
+            return 0
+
+        embed = Embed(
+            description="This game was ended after {} minutes without a move.".format(
+                self.ttl // 60
+            )
+        ).to_dict()
+        await asyncio.gather(
+            *(
+                self.bot.http.edit_message(game.channel, game.message, embed=embed)
+                for game in games
+                if game.channel and game.message
+            ),
+            return_exceptions=True,
+        )
+
+        self.reaped += len(games)
+        self.bot.metrics.gauges["ttt_games_reaped"] = self.reaped
+        print("Ended {} abandoned Tic Tac Toe games".format(len(games)))
+        return len(games)
+
+    async def sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as error:
+                print("Sweeping Tic Tac Toe games failed:", error)
+
+    async def refresh_board(self, ctx: Context, game: Game):
+        if game.game_id in self.pending_edits:
+            self.pending_edits[game.game_id] = True
+            return
+
+        self.pending_edits[game.game_id] = True
+        try:
+            msg = self.board_messages.get(game.game_id)
+            if not msg:
+                msg = await ctx.fetch_message(game.message)
+                self.board_messages[game.game_id] = msg
+
+            while self.pending_edits[game.game_id]:
+                self.pending_edits[game.game_id] = False
+                await msg.edit(
+                    embed=Embed(
+                        description=game.board.render(), colour=msg.embeds[0].colour
+                    )
+                )
+        finally:
+            del self.pending_edits[game.game_id]
+
+    def forget(self, game: Game):
+        self.index.remove(game)
+        self.board_messages.pop(game.game_id, None)
+
+    async def post_board(self, ctx: Context, game: Game):
+        ttt_message: Message = await send_embed(
+            ctx,
+            "```"
+            "1 | 2 | 3\t\t\t Type !place <position> to play your turn.\n"
+            "---------\t\t\t Get three in a row/diagonal to win.\n"
+            "4 | 5 | 6\t\t\t It is currently crosses' turn.\n"
+            "---------\t\t\t Type !end to end the game.\n"
+            "7 | 8 | 9\n"
+            "```",
+            coalesce=False,
+        )
+
+        game.message = ttt_message.id
+        game.channel = ctx.channel.id
+        self.board_messages[game.game_id] = ttt_message
+        await self.bot.games.update(
+            dict(game_id=game.game_id, message=ttt_message.id, channel=ctx.channel.id),
+            ["game_id"],
+        )
 
     @commands.command(
         brief="Play a game of Tic Tac Toe!",
         help="Starts a Tic Tac Toe game. Use `{0}accept <game id>` to accept a game, "
         "then to put a cross/nought use `{0}place <position>` and use `{0}end` to end "
-        "the game if needed.".format(bot.command_prefix),
+        "the game if needed. Use `{0}ttt easy`, `{0}ttt normal` or `{0}ttt perfect` "
+        "to play against the bot instead.".format(PREFIX),
         aliases=["tictactoe"],
     )
-    async def ttt(self, ctx: Context):
-        row = games.find_one(
-            (games.table.c.noughts == ctx.author.id)
-            | (games.table.c.crosses == ctx.author.id)
-        )
-
-        if not row:
-            games.insert(dict(crosses=ctx.author.id, guild_id=ctx.guild.id))
-            game_id = games.find_one(crosses=ctx.author.id)["game_id"]
+    async def ttt(self, ctx: Context, difficulty: Optional[str] = None):
+        await self.load_index()
+        if difficulty and difficulty.lower() not in DIFFICULTIES:
+            await send_embed(
+                ctx, "Difficulty should be one of {}.".format(", ".join(DIFFICULTIES))
+            )
+        elif not self.index.reserve(ctx.author.id):
+            await send_embed(ctx, "You are already in a game!")
+        elif difficulty:
+            now = int(time.time())
+            skill = DIFFICULTIES[difficulty.lower()]
+            try:
+                game_id = await self.bot.games.insert(
+                    dict(
+                        crosses=ctx.author.id,
+                        noughts=self.bot.user.id,
+                        guild_id=ctx.guild.id,
+                        last_active=now,
+                        skill=skill,
+                    )
+                )
+            finally:
+                self.index.release(ctx.author.id)
+            game = Game(
+                game_id,
+                ctx.guild.id,
+                ctx.author.id,
+                self.bot.user.id,
+                last_active=now,
+                skill=skill,
+            )
+            self.index.add(game)
+            await self.post_board(ctx, game)
+        else:
+            now = int(time.time())
+            try:
+                game_id = await self.bot.games.insert(
+                    dict(crosses=ctx.author.id, guild_id=ctx.guild.id, last_active=now)
+                )
+            finally:
+                self.index.release(ctx.author.id)
+            self.index.add(Game(game_id, ctx.guild.id, ctx.author.id, last_active=now))
             await send_embed(
                 ctx,
                 "{} has started a Tic Tac Toe game! Type `!accept {}` to join.".format(
                     ctx.author.name, game_id
                 ),
             )
-        else:
-            await send_embed(ctx, "You are already in a game!")
 
     @commands.command(hidden=True)
     async def accept(self, ctx: Context, game_id: int):
-        row = games.find_one(game_id=game_id)
-        in_game = games.find_one(
-            (games.table.c.noughts == ctx.author.id)
-            | (games.table.c.crosses == ctx.author.id)
-        )
+        await self.load_index()
+        game = self.index.get(game_id)
 
-        if not row:
+        if not game or game.noughts:
             await send_embed(ctx, "Invalid game id, or that game doesn't exist.")
-        elif ctx.author.id == row["crosses"]:
+        elif ctx.author.id == game.crosses:
             await send_embed(ctx, "You cannot join your own game!")
-        elif in_game:
+        elif self.index.busy(ctx.author.id):
             await send_embed(ctx, "You are already in a game!")
         else:
-            games.update(dict(game_id=game_id, noughts=ctx.author.id), ["game_id"])
+            self.index.join(game, ctx.author.id)
+            self.index.touch(game, int(time.time()))
+            await self.bot.games.update(
+                dict(
+                    game_id=game_id, noughts=ctx.author.id, last_active=game.last_active
+                ),
+                ["game_id"],
+            )
             await send_embed(
                 ctx,
                 "You have successfully joined the game! <@{}> type `!place <position>` to start!".format(
-                    row["crosses"]
+                    game.crosses
                 ),
             )
-            ttt_message: Message = await send_embed(
-                ctx,
-                "```"
-                "1 | 2 | 3\t\t\t Type !place <position> to play your turn.\n"
-                "---------\t\t\t Get three in a row/diagonal to win.\n"
-                "4 | 5 | 6\t\t\t It is currently crosses' turn.\n"
-                "---------\t\t\t Type !end to end the game.\n"
-                "7 | 8 | 9\n"
-                "```",
-            )
-
-            games.update(dict(game_id=game_id, message=ttt_message.id), ["game_id"])
+            await self.post_board(ctx, game)
 
     @commands.command(hidden=True)
     async def place(self, ctx: Context, arg):
-        row = games.find_one(
-            (games.table.c.noughts == ctx.author.id)
-            | (games.table.c.crosses == ctx.author.id)
-        )
+        await self.load_index()
+        game = self.index.for_player(ctx.author.id)
 
-        if not row:
+        if not game:
             await send_embed(ctx, "You are not in a game! Type `!ttt` to start one.")
             return
-        elif not row["message"]:
+        elif not game.message:
             await send_embed(ctx, "The game hasn't started yet!")
             return
-        elif row[row["turn"]] != ctx.author.id:
+
+        board = game.board
+        if game.player(board.turn) != ctx.author.id:
             await send_embed(ctx, "It is not your turn.")
             return
         elif arg not in [str(i) for i in range(1, 10)]:
             await send_embed(ctx, "Invalid argument, type a number from 1 - 9")
             return
 
-        cmd = await ctx.fetch_message(ctx.message.id)
-        await cmd.delete()
+        # Not awaited, so the board cannot change between the checks above and
+        # the move below.
+        self.bot.loop.create_task(ctx.message.delete()).add_done_callback(
+            ignore_http_errors
+        )
 
-        symbol = "X" if row["turn"] == "crosses" else "O"
-        positions = games.find_one(game_id=row["game_id"])["positions"]
-        p = json.loads(positions)
-        if p[arg] == "X" or p[arg] == "O":
+        if not board.place(int(arg)):
             await send_embed(ctx, "That spot is already taken!")
             return
-        else:
-            p[arg] = symbol
-        p = json.dumps(p)
-        games.update(dict(game_id=row["game_id"], positions=p), ["game_id"])
-
-        positions = games.find_one(game_id=row["game_id"])["positions"]
-        p = json.loads(positions)
-
-        def end_game():
-            games.delete(game_id=row["game_id"])
-
-        msg = await ctx.fetch_message(row["message"])
-        await msg.edit(
-            embed=Embed(
-                description="```"
-                "{0} | {1} | {2}\t\t Type !place <position> to play your turn\n"
-                "---------\t\t Get three in a row/diagonal to win.\n"
-                "{3} | {4} | {5}\t\t It is currently {9}' turn.\n"
-                "---------\n"
-                "{6} | {7} | {8}\n"
-                "```".format(
-                    p["1"],
-                    p["2"],
-                    p["3"],
-                    p["4"],
-                    p["5"],
-                    p["6"],
-                    p["7"],
-                    p["8"],
-                    p["9"],
-                    row["turn"],
+        if game.skill is not None and not board.winner() and not board.is_full():
+            board.place(choose_move(board, game.skill))
+        self.index.touch(game, int(time.time()))
+
+        # The move is saved before the board is edited, so a failed edit
+        # cannot leave the index ahead of the database.
+        win = board.winner()
+        if not win and not board.is_full():
+            await self.bot.games.update(
+                dict(
+                    game_id=game.game_id,
+                    crosses_mask=board.crosses,
+                    noughts_mask=board.noughts,
+                    last_active=game.last_active,
                 ),
-                colour=msg.embeds[0].colour,
+                ["game_id"],
             )
-        )
-
-        for h in [
-            p["1"] + p["2"] + p["3"],
-            p["4"] + p["5"] + p["6"],
-            p["7"] + p["8"] + p["9"],
-        ]:
-            if h == "XXX":
-                await send_embed(ctx, "<@{}> has won on Rows!".format(row["crosses"]))
-                end_game()
-                return
-            elif h == "OOO":
-                await send_embed(ctx, "<@{}> has won on Rows!".format(row["noughts"]))
-                end_game()
-                return
-
-        for v in [
-            p["1"] + p["4"] + p["7"],
-            p["2"] + p["5"] + p["8"],
-            p["3"] + p["6"] + p["9"],
-        ]:
-            if v == "XXX":
-                await send_embed(
-                    ctx, "<@{}> has won on Columns!".format(row["crosses"])
-                )
-                end_game()
-                return
-            elif v == "OOO":
-                await send_embed(
-                    ctx, "<@{}> has won on Columns!".format(row["noughts"])
-                )
-                end_game()
-                return
-
-        for d in [p["1"] + p["5"] + p["9"], p["3"] + p["5"] + p["7"]]:
-            if d == "XXX":
-                await send_embed(
-                    ctx, "<@{}> has won on Diagonals!".format(row["crosses"])
-                )
-                end_game()
-                return
-            elif d == "OOO":
-                await send_embed(
-                    ctx, "<@{}> has won on Diagonals!".format(row["noughts"])
-                )
-                end_game()
-                return
-
-        if " " not in p.values():
-            await send_embed(ctx, "It ended in a tie!")
-            end_game()
+            await self.refresh_board(ctx, game)
             return
 
-        next_turn = "noughts" if row["turn"] == "crosses" else "crosses"
-        games.update(dict(game_id=row["game_id"], turn=next_turn), ["game_id"])
+        self.index.remove(game)
+        try:
+            await self.bot.games.delete(game_id=game.game_id)
+            await self.refresh_board(ctx, game)
+        finally:
+            self.board_messages.pop(game.game_id, None)
+        if win:
+            side, line = win
+            await send_embed(
+                ctx, "<@{}> has won on {}!".format(game.player(side), line)
+            )
+        else:
+            await send_embed(ctx, "It ended in a tie!")
 
     @commands.command(hidden=True)
     async def end(self, ctx: Context):
-        row = games.find_one(
-            (games.table.c.noughts == ctx.author.id)
-            | (games.table.c.crosses == ctx.author.id)
-        )
+        await self.load_index()
+        game = self.index.for_player(ctx.author.id)
 
-        if not row:
+        if not game:
             await send_embed(ctx, "You are not in a game! Type `!ttt` to start one.")
         else:
-            games.delete(game_id=row["game_id"])
+            self.forget(game)
+            await self.bot.games.delete(game_id=game.game_id)
             await send_embed(ctx, "{} has ended the game.".format(ctx.author.name))
 
 
 class Moderation(commands.Cog):
     def __init__(self, client):
         self.bot = client
+        self.bans = BanCache()
+
+        settings = client.config.get("moderation", {})
+        self.concurrency = settings.get("concurrency", 5)
+        self.progress_interval = settings.get("progress_interval", 2)
+        self.max_targets = settings.get("max_targets", 1000)
+
+    async def bulk(self, ctx: Context, verbs: Tuple[str, str], action, targets: str):
+        """Run ``action`` on every member listed in ``targets`` or in the
+        attached files, editing one embed as it goes."""
+        ids, reason = parse_targets(targets or "")
+        found = dict.fromkeys(ids)
+        for attachment in ctx.message.attachments:
+            if len(found) > self.max_targets:
+                break
+            text = (await attachment.read()).decode(errors="ignore")
+            # Stopping one past the limit is enough to reject the list.
+            found.update(dict.fromkeys(parse_id_list(text, self.max_targets + 1)))
+        found.pop(ctx.author.id, None)
+        found.pop(self.bot.user.id, None)
+        ids = list(found)
+
+        if not ids or len(ids) > self.max_targets:
+            await send_embed(
+                ctx,
+                "List between 1 and {} members as mentions or ids, or attach a file "
+                "of ids, followed by an optional reason.".format(self.max_targets),
+                title="Invalid input",
+                colour="ff0000",
+            )
+            return
+
+        status: Message = await send_embed(
+            ctx, "{} 0/{} members...".format(verbs[0], len(ids)), coalesce=False
+        )
+        colour = status.embeds[0].colour
+
+        async def progress(run: BulkAction):
+            await status.edit(
+                embed=Embed(
+                    description="{} {}/{} members, {} failed...".format(
+                        verbs[0], run.finished, run.total, len(run.failed)
+                    ),
+                    colour=colour,
+                )
+            )
+
+        run = await BulkAction(
+            lambda user_id: action(Object(id=user_id), reason=reason or None),
+            self.concurrency,
+            self.progress_interval,
+            progress,
+        ).run(ids)
+        await status.edit(
+            embed=Embed(title="Done!", description=run.summary(verbs[1]), colour=colour)
+        )
+
+    @commands.command(
+        brief="Ban many users at once",
+        help="Bans every mentioned user or id, or every id in an attached file, followed by an "
+        "optional reason. Requires ban member permissions.",
+    )
+    @commands.has_permissions(ban_members=True)
+    async def massban(self, ctx: Context, *, targets: Optional[str] = None):
+        await self.bulk(ctx, ("Banning", "Banned"), ctx.guild.ban, targets)
+
+    @commands.command(
+        brief="Unban many users at once",
+        help="Unbans every id, or every id in an attached file, followed by an optional "
+        "reason. Requires ban member permissions.",
+    )
+    @commands.has_permissions(ban_members=True)
+    async def massunban(self, ctx: Context, *, targets: Optional[str] = None):
+        await self.bulk(ctx, ("Unbanning", "Unbanned"), ctx.guild.unban, targets)
+
+    @commands.command(
+        brief="Kick many users at once",
+        help="Kicks every mentioned user or id, or every id in an attached file, followed by "
+        "an optional reason. Requires kick member permissions.",
+    )
+    @commands.has_permissions(kick_members=True)
+    async def masskick(self, ctx: Context, *, targets: Optional[str] = None):
+        await self.bulk(ctx, ("Kicking", "Kicked"), ctx.guild.kick, targets)
+
+    @commands.Cog.listener()
+    async def on_member_ban(self, guild, user):
+        self.bans.banned(guild.id, user)
+
+    @commands.Cog.listener()
+    async def on_member_unban(self, guild, user):
+        self.bans.unbanned(guild.id, user.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.bans.forget(guild.id)
 
     @commands.command(
         brief="Ban a user from the server",
@@ -637,21 +1072,18 @@ class Moderation(commands.Cog):
         brief="Unban a user from the server",
         help="Unbans a user from the server, requires ban member permissions, use an id or their full name for the "
         "member argument. Use `{}ban_list` to find a list of members who are banned.".format(
-            bot.command_prefix
+            PREFIX
         ),
         aliases=["ub", "free"],
     )
     @commands.has_permissions(ban_members=True)
     async def unban(self, ctx: Context, member, *, reason: Optional[str] = None):
-        user = None
         try:
             user_id = int(member)
-            user = await bot.fetch_user(user_id)
+            bans = await self.bans.get(ctx.guild)
+            user = bans.by_id.get(user_id) or await self.bot.fetch_user(user_id)
         except ValueError:
-            name, discrim = member.split("#")
-            for ban in await ctx.guild.bans():
-                if name == ban.user.name and discrim == ban.user.discriminator:
-                    user = ban.user
+            user = await self.bans.resolve(ctx.guild, member)
 
         if not user:
             await send_embed(
@@ -660,11 +1092,10 @@ class Moderation(commands.Cog):
                 title="Invalid input",
                 colour="ff0000",
             )
+            return
 
         await ctx.guild.unban(user, reason=reason)
-        await send_embed(
-            ctx, "{} has been unbanned!".format(user.name),
-        )
+        await send_embed(ctx, "{} has been unbanned!".format(user.name))
 
     @commands.command(
         brief="Kick a user from the server",
@@ -678,14 +1109,13 @@ class Moderation(commands.Cog):
 
     @commands.command(
         brief="Shows a list of banned members",
-        help="Shows all banned members in the server, with their username and their id. Useful for `{}unban`".format(
-            bot.command_prefix
-        ),
+        help="Shows all banned members in the server, with their username and their id, {} per page. Useful "
+        "for `{}unban`".format(BANS_PER_PAGE, PREFIX),
         aliases=["bl", "bans"],
     )
     @commands.has_permissions(ban_members=True)
-    async def ban_list(self, ctx: Context):
-        bans = await ctx.guild.bans()
+    async def ban_list(self, ctx: Context, page: int = 1):
+        bans = await self.bans.get(ctx.guild)
         if not bans:
             await send_embed(
                 ctx,
@@ -694,17 +1124,200 @@ class Moderation(commands.Cog):
                 colour="ff0000",
             )
         else:
-            msg = "Username:{} ID:".format(7 * "\t")
-            for ban in bans:
-                full_name = "{}#{}".format(ban.user.name, ban.user.discriminator)
-                tab_space = 9 - math.floor(len(full_name) / 4)
-                msg += "\n{}{}{}".format(full_name, tab_space * "\t", ban.user.id)
+            pages = bans.pages(BANS_PER_PAGE)
+            page = min(max(page, 1), pages)
+            await ctx.send(
+                "```{}```Page {}/{}".format(
+                    render_page(bans.page(page, BANS_PER_PAGE)), page, pages
+                )
+            )
+
 
-            await ctx.send("```{}```".format(msg))
+class Admin(commands.Cog):
+    def __init__(self, client):
+        self.bot = client
 
+    def backup_path(self, name: str) -> str:
+        directory = self.bot.config.get("backup_dir", "backups")
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(
+            directory, "{}-{}".format(time.strftime("%Y%m%d-%H%M%S"), name)
+        )
+
+    async def check_sqlite(self, ctx: Context) -> bool:
+        if self.bot.database is None:
+            await send_embed(
+                ctx, "Only the SQLite storage can be backed up.", colour="ff0000"
+            )
+        return self.bot.database is not None
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def backup(self, ctx: Context):
+        if not await self.check_sqlite(ctx):
+            return
+
+        await self.bot.storage.flush()
+        lines = []
+        for partition in self.bot.database.partitions:
+            source = backup.sqlite_path(partition.url)
+            target = self.backup_path(os.path.basename(source) + ".db")
+            result = await self.bot.loop.run_in_executor(
+                None, backup.backup, source, target
+            )
+            lines.append(
+                "Copied {} pages to `{}` in {:.2f}s".format(
+                    result["pages"], target, result["seconds"]
+                )
+            )
+        await send_embed(ctx, "\n".join(lines), title="Backup complete")
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def export(self, ctx: Context, table: str, fmt: str = "jsonl"):
+        if table not in ("users", "ttt_games") or fmt not in ("jsonl", "csv"):
+            await send_embed(
+                ctx,
+                "Export `users` or `ttt_games` as `jsonl` or `csv`.",
+                colour="ff0000",
+            )
+            return
+        if not await self.check_sqlite(ctx):
+            return
+
+        await self.bot.storage.flush()
+        lines = []
+        partitions = self.bot.database.partitions
+        for bucket, partition in enumerate(partitions):
+            target = self.backup_path("{}.{}.{}".format(table, bucket, fmt))
+            count = await self.bot.loop.run_in_executor(
+                None,
+                backup.export_file,
+                backup.sqlite_path(partition.url),
+                table,
+                target,
+                fmt,
+                bucket,
+                len(partitions),
+            )
+            lines.append("Exported {} rows to `{}`".format(count, target))
+        await send_embed(ctx, "\n".join(lines), title="Export complete")
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def memory(self, ctx: Context, action: str = "report", limit: int = 10):
+        if action == "start":
+            tracemalloc.start()
+            await send_embed(ctx, "Allocation tracing started.")
+            return
+        if action == "stop":
+            # Frees the traces, which can take more memory than they explain.
+            tracemalloc.stop()
+            await send_embed(ctx, "Allocation tracing stopped.")
+            return
+        if action.isdigit():
+            limit = int(action)
+
+        caches = "\n".join(
+            "{} = {}".format(name, count)
+            for name, count in memory.cache_sizes(self.bot).items()
+        )
+        if tracemalloc.is_tracing():
+            top = await self.bot.loop.run_in_executor(
+                None, memory.top_allocations, limit
+            )
+            allocations = "\n".join(
+                "`{}` {} in {} blocks".format(location, memory.size(size), count)
+                for location, size, count in top
+            )
+            traced, peak = tracemalloc.get_traced_memory()
+            footer = "Traced {}, peak {}.".format(
+                memory.size(traced), memory.size(peak)
+            )
+        else:
+            allocations = "Tracing is off, start it with `{}memory start`.".format(
+                PREFIX
+            )
+            footer = None
+
+        await send_embed(
+            ctx,
+            title="Memory: {} resident".format(memory.size(memory.rss())),
+            fields=[
+                Field("Caches", caches, False),
+                Field("Top allocations", allocations or "None", False),
+            ],
+            footer=footer,
+        )
+
+    @staticmethod
+    def histogram_lines(histograms, limit: int = 10) -> str:
+        ranked = sorted(histograms.items(), key=lambda item: -item[1].count)[:limit]
+        return (
+            "\n".join(
+                "`{}` n={} p50={:g}ms p99={:g}ms".format(
+                    name if isinstance(name, str) else " ".join(name),
+                    histogram.count,
+                    histogram.quantile(0.5) * 1000,
+                    histogram.quantile(0.99) * 1000,
+                )
+                for name, histogram in ranked
+            )
+            or "None"
+        )
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def stats(self, ctx: Context):
+        metrics = self.bot.metrics
+        self.bot.update_gauges()
+        shards = "\n".join(
+            "{}shard {}: {:.0f}ms".format(
+                "**>** " if ctx.guild and ctx.guild.shard_id == shard_id else "",
+                shard_id,
+                latency * 1000,
+            )
+            for shard_id, latency in self.bot.latencies
+        )
+        errors = "\n".join(
+            "`{}` {} x{}".format(command, error, count)
+            for (command, error), count in metrics.errors.most_common(10)
+        )
+        await send_embed(
+            ctx,
+            title="Bot statistics",
+            fields=[
+                Field("Commands", self.histogram_lines(metrics.commands), False),
+                Field("Database", self.histogram_lines(metrics.database), False),
+                Field("HTTP", self.histogram_lines(metrics.http), False),
+                Field("Errors", errors or "None", False),
+                Field(
+                    "Shards ({} total)".format(self.bot.shard_count),
+                    shards or "None",
+                    False,
+                ),
+                Field(
+                    "Gauges",
+                    "\n".join(
+                        "{} = {}".format(name, value)
+                        for name, value in sorted(metrics.gauges.items())
+                    ),
+                    False,
+                ),
+            ],
+            footer="Up for {} seconds. Latency buckets are upper bounds.".format(
+                int(time.time() - metrics.started)
+            ),
+        )
 
-for c in [Miscellaneous, Economy, Games, Moderation]:
-    bot.add_cog(c(bot))
 
-bot.run(config["token"])
-db.close()
+def create_bot(
+    config: Dict[str, Any], db_url: str = "sqlite:///economy", **options
+) -> Bot:
+    options.setdefault("shard_count", config.get("shard_count"))
+    options.setdefault("shard_ids", config.get("shard_ids"))
+    options = dict(memory.client_options(config), **options)
+    bot = Bot(config, db_url, command_prefix=PREFIX, help_command=None, **options)
+    for c in [Miscellaneous, Economy, Games, Moderation, Admin]:
+        bot.add_cog(c(bot))
+    return bot
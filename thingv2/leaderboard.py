@@ -0,0 +1,142 @@
+from bisect import bisect_left, insort
+from typing import TYPE_CHECKING, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from thingv2.accounts import Account
+
+BOARDS = ("wallet", "bank", "total")
+
+
+def values(balance: int, bank: int) -> Dict[str, int]:
+    return dict(wallet=balance, bank=bank, total=balance + bank)
+
+
+class Ranking:
+    """Users ordered by one value, highest first, ties broken by user id.
+
+    Only positive values are ranked. Updates are a binary search plus one
+    insertion into a flat list, which for a few hundred thousand entries is
+    cheaper than any tree built out of Python objects.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []
+        self._values: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(self, user_id: int, value: int):
+        old = self._values.get(user_id)
+        if old == value:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, user_id))]
+            del self._values[user_id]
+        if value > 0:
+            insort(self._keys, (-value, user_id))
+            self._values[user_id] = value
+
+    def rank(self, user_id: int) -> Optional[int]:
+        value = self._values.get(user_id)
+        if value is None:
+            return None
+        return bisect_left(self._keys, (-value, user_id)) + 1
+
+    def page(self, number: int, per_page: int) -> List[Tuple[int, int]]:
+        start = (number - 1) * per_page
+        return [
+            (user_id, -key) for key, user_id in self._keys[start : start + per_page]
+        ]
+
+    def pages(self, per_page: int) -> int:
+        return max(1, -(-len(self._keys) // per_page))
+
+
+class Leaderboard:
+    """Global and per-guild rankings for every board, kept current by
+    :meth:`update` instead of sorting ``users`` on each request."""
+
+    def __init__(self):
+        self.rankings: Dict[str, Ranking] = {board: Ranking() for board in BOARDS}
+        self.guilds: Dict[int, Dict[str, Ranking]] = {}
+        self.members: Dict[int, Set[int]] = {}
+        self._values: Dict[int, Dict[str, int]] = {}
+        self._changed: Optional[Set[int]] = None
+
+    def board(self, board: str, guild_id: Optional[int] = None) -> Ranking:
+        if guild_id is None:
+            return self.rankings[board]
+        rankings = self.guilds.get(guild_id)
+        return rankings[board] if rankings else Ranking()
+
+    def _apply(self, user_id: int, guild_ids: Iterable[int]):
+        current = self._values.get(user_id, {})
+        for guild_id in guild_ids:
+            rankings = self.guilds.setdefault(
+                guild_id, {board: Ranking() for board in BOARDS}
+            )
+            for board in BOARDS:
+                rankings[board].update(user_id, current.get(board, 0))
+
+    def load(self, accounts: Iterable[Mapping], members: Iterable[Mapping]):
+        """Fill the rankings from ``users`` and ``guild_members`` rows.
+
+        Users already changed through :meth:`update` while the rows were being
+        read keep their newer values.
+        """
+        for row in accounts:
+            if row["id"] not in self._values:
+                self._set(row["id"], values(row["balance"], row["bank"]))
+        for row in members:
+            self.join(row["guild_id"], row["user_id"])
+
+    def start_refresh(self):
+        """Track who changes from now on, so :meth:`refresh` with rows read
+        in the meantime keeps their newer values."""
+        self._changed = set()
+
+    def refresh(self, accounts: Iterable[Mapping]):
+        """Replace every balance with ``users`` rows, for when other processes
+        change them too."""
+        changed, self._changed = self._changed or set(), None
+        seen = set()
+        for row in accounts:
+            seen.add(row["id"])
+            if row["id"] not in changed:
+                self._set(row["id"], values(row["balance"], row["bank"]))
+        for user_id in list(self._values):
+            if user_id not in seen and user_id not in changed:
+                self._set(user_id, values(0, 0))
+
+    def is_member(self, guild_id: int, user_id: int) -> bool:
+        return guild_id in self.members.get(user_id, ())
+
+    def join(self, guild_id: int, user_id: int):
+        guilds = self.members.setdefault(user_id, set())
+        if guild_id not in guilds:
+            guilds.add(guild_id)
+            self._apply(user_id, [guild_id])
+
+    def leave(self, guild_id: int, user_id: int):
+        guilds = self.members.get(user_id)
+        if guilds and guild_id in guilds:
+            guilds.discard(guild_id)
+            for ranking in self.guilds[guild_id].values():
+                ranking.update(user_id, 0)
+
+    def forget_guild(self, guild_id: int):
+        self.guilds.pop(guild_id, None)
+        for guilds in self.members.values():
+            guilds.discard(guild_id)
+
+    def _set(self, user_id: int, current: Dict[str, int]):
+        self._values[user_id] = current
+        for board, value in current.items():
+            self.rankings[board].update(user_id, value)
+        self._apply(user_id, self.members.get(user_id, ()))
+
+    def update(self, user_id: int, account: "Account"):
+        if self._changed is not None:
+            self._changed.add(user_id)
+        self._set(user_id, values(account.balance, account.bank))
@@ -0,0 +1,253 @@
+"""Append-only ledger of every balance change.
+
+``users`` holds a snapshot of the balances as of ledger entry
+``ledger_snapshot`` (kept in ``settings``); a user's current balance is that
+snapshot plus the sum of their later entries. Tools::
+
+    python -m thingv2.ledger verify economy
+    python -m thingv2.ledger replay economy
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from thingv2.accounts import Account
+from thingv2.metrics import current_command
+from thingv2.storage import Database
+from thingv2.writebehind import CachedAccounts
+
+INSERT_SQL = (
+    "INSERT INTO ledger (user_id, kind, command, balance, bank, claim_cd, at) "
+    "VALUES (:user_id, :kind, :command, :balance, :bank, :claim_cd, :at)"
+)
+
+SNAPSHOT_SEQ = (
+    "SELECT COALESCE(MAX(value), 0) FROM settings WHERE key = 'ledger_snapshot'"
+)
+
+SET_SNAPSHOT_SQL = (
+    "INSERT INTO settings (key, value) VALUES ('ledger_snapshot', :seq) "
+    "ON CONFLICT (key) DO UPDATE SET value = excluded.value"
+)
+
+# Correlated subqueries rather than UPDATE ... FROM, which needs SQLite 3.33
+ENTRIES = "FROM ledger WHERE user_id = users.id AND seq > :after AND seq <= :upto"
+APPLY_SQL = (
+    "UPDATE users SET balance = balance + (SELECT SUM(balance) {0}), "
+    "bank = bank + (SELECT SUM(bank) {0}), "
+    "claim_cd = COALESCE((SELECT MAX(claim_cd) {0}), claim_cd) "
+    "WHERE id IN (SELECT user_id FROM ledger WHERE seq > :after AND seq <= :upto)"
+).format(ENTRIES)
+
+READ_SQL = (
+    "SELECT users.balance + COALESCE(SUM(ledger.balance), 0) AS balance, "
+    "users.bank + COALESCE(SUM(ledger.bank), 0) AS bank, "
+    "COALESCE(MAX(ledger.claim_cd), users.claim_cd) AS claim_cd "
+    "FROM users LEFT JOIN ledger ON ledger.user_id = users.id "
+    "AND ledger.seq > ({}) WHERE users.id = :id GROUP BY users.id".format(SNAPSHOT_SEQ)
+)
+
+VERIFY_SQL = (
+    "SELECT users.id, users.balance, users.bank, "
+    "COALESCE(t.balance, 0) AS ledger_balance, COALESCE(t.bank, 0) AS ledger_bank "
+    "FROM users LEFT JOIN (SELECT user_id, SUM(balance) AS balance, "
+    "SUM(bank) AS bank FROM ledger WHERE seq <= :upto GROUP BY user_id) AS t "
+    "ON t.user_id = users.id "
+    "WHERE users.balance != COALESCE(t.balance, 0) OR users.bank != COALESCE(t.bank, 0)"
+)
+
+
+def snapshot(database: Database) -> int:
+    """Fold ledger entries past the last snapshot into ``users``.
+
+    The first snapshot of a database that has no ledger yet writes an
+    ``open`` entry per user holding their balance, so the ledger alone always
+    adds up to every balance.
+    """
+    connection = database.db.executable
+    with database.db:
+        after = connection.execute(text(SNAPSHOT_SEQ)).scalar()
+        upto = connection.execute(text("SELECT COALESCE(MAX(seq), 0) FROM ledger"))
+        upto = upto.scalar()
+        if not upto:
+            connection.execute(
+                text(
+                    "INSERT INTO ledger (user_id, kind, command, balance, bank, "
+                    "claim_cd, at) SELECT id, 'open', '', balance, bank, claim_cd, "
+                    ":now FROM users WHERE balance != 0 OR bank != 0 OR claim_cd != 0"
+                ),
+                now=int(time.time()),
+            )
+            upto = connection.execute(
+                text("SELECT COALESCE(MAX(seq), 0) FROM ledger")
+            ).scalar()
+        elif upto > after:
+            connection.execute(text(APPLY_SQL), after=after, upto=upto)
+        connection.execute(text(SET_SNAPSHOT_SQL), seq=upto)
+    return upto
+
+
+def verify(database: Database) -> List[Dict[str, Any]]:
+    connection = database.db.executable
+    with database.db:
+        upto = connection.execute(text(SNAPSHOT_SEQ)).scalar()
+        return [dict(row) for row in connection.execute(text(VERIFY_SQL), upto=upto)]
+
+
+def replay(database: Database) -> int:
+    """Rebuild every balance in ``users`` from the ledger alone."""
+    connection = database.db.executable
+    with database.db:
+        upto = connection.execute(
+            text("SELECT COALESCE(MAX(seq), 0) FROM ledger")
+        ).scalar()
+        connection.execute(text("UPDATE users SET balance = 0, bank = 0"))
+        connection.execute(text(APPLY_SQL), after=0, upto=upto)
+        connection.execute(text(SET_SNAPSHOT_SQL), seq=upto)
+    return upto
+
+
+class LedgerAccounts(CachedAccounts):
+    """Accounts whose every change is appended to the ``ledger`` table.
+
+    A command waits for its entry to be committed. Entries that arrive while a
+    commit is running are written together by the next one, so under load each
+    fsync covers many commands. Every ``snapshot_interval`` seconds the new
+    entries are folded into ``users``.
+    """
+
+    def __init__(self, database: Database, snapshot_interval: float = 60):
+        super().__init__(database)
+        self.snapshot_interval = snapshot_interval
+        self._pending: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]] = []
+        self._committing = False
+        self._task: Optional[asyncio.Task] = None
+        for partition in self.database.partitions:
+            partition.write_sync(snapshot, partition)
+
+    async def _read(self, user_id: int) -> Optional[Account]:
+        rows = await self.database.route(user_id).query(READ_SQL, id=user_id)
+        return Account(**rows[0]) if rows else None
+
+    async def _store(self, user_id: int, account: Account, kind: str) -> Account:
+        old = self._accounts[user_id]
+        self._accounts[user_id] = account
+        if self.observer:
+            self.observer(user_id, account)
+
+        entry = dict(
+            user_id=user_id,
+            kind=kind,
+            command=current_command.get(),
+            balance=account.balance - old.balance,
+            bank=account.bank - old.bank,
+            claim_cd=account.claim_cd if account.claim_cd != old.claim_cd else None,
+            at=int(time.time()),
+        )
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((entry, future))
+        if not self._committing:
+            self._committing = True
+            asyncio.ensure_future(self._commit())
+        await future
+        return account
+
+    async def _commit(self):
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                futures = {id(entry): future for entry, future in batch}
+                groups = self.database.split([entry for entry, _ in batch], "user_id")
+                results = await asyncio.gather(
+                    *(
+                        partition.execute_many(INSERT_SQL, entries)
+                        for partition, entries in groups
+                    ),
+                    return_exceptions=True,
+                )
+                for (_, entries), result in zip(groups, results):
+                    if isinstance(result, Exception):
+                        # The in-memory balances already include these
+                        # entries, so keep them for the next commit.
+                        self._pending[:0] = [(entry, None) for entry in entries]
+                    for entry in entries:
+                        future = futures[id(entry)]
+                        if not future or future.done():
+                            continue
+                        if isinstance(result, Exception):
+                            future.set_exception(result)
+                        else:
+                            future.set_result(None)
+                if any(isinstance(result, Exception) for result in results):
+                    return
+        finally:
+            self._committing = False
+
+    async def flush(self):
+        for partition in self.database.partitions:
+            await partition.write(snapshot, partition)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await self.flush()
+            except Exception as error:
+                print("Ledger snapshot failed:", error)
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.ensure_future(self._run())
+
+    def close(self):
+        entries = [entry for entry, _ in self._pending]
+        self._pending = []
+        for partition, rows in self.database.split(entries, "user_id"):
+            if rows:
+                partition.execute_many_sync(INSERT_SQL, rows)
+        for partition in self.database.partitions:
+            partition.write_sync(snapshot, partition)
+
+
+def main(argv: Optional[List[str]] = None):
+    from thingv2.partitions import open_database
+    from thingv2.schema import bootstrap
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["verify", "replay", "snapshot"])
+    parser.add_argument("database", help="path of the database")
+    parser.add_argument("--partitions", type=int, default=1)
+    arguments = parser.parse_args(argv)
+
+    database = open_database(
+        "sqlite:///{}".format(arguments.database), dict(partitions=arguments.partitions)
+    )
+    failed = False
+    try:
+        bootstrap(database)
+        for partition in database.partitions:
+            if arguments.command == "verify":
+                mismatches = partition.write_sync(verify, partition)
+                for row in mismatches:
+                    print(
+                        "{id}: users has {balance}/{bank}, "
+                        "ledger has {ledger_balance}/{ledger_bank}".format(**row)
+                    )
+                failed = failed or bool(mismatches)
+                print("{}: {} mismatches".format(partition.url, len(mismatches)))
+            else:
+                fn = replay if arguments.command == "replay" else snapshot
+                seq = partition.write_sync(fn, partition)
+                print("{}: balances as of entry {}".format(partition.url, seq))
+    finally:
+        database.close()
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
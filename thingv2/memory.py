@@ -0,0 +1,116 @@
+"""Keeping the bot's memory flat as it joins more guilds.
+
+``config["memory"]`` turns off the gateway caches the bot does not need::
+
+    "memory": {"max_messages": 0, "members": false, "presences": false}
+
+``max_messages`` is the size of the message cache (1000 by default, 0
+disables it), ``members`` whether every guild's member list is downloaded and
+cached, and ``presences`` whether presence and typing updates are received at
+all. The bot only reads the message that triggered a command and the members
+it mentions, so none of them are needed.
+
+Member join and leave events keep the server leaderboards current as members
+come and go without saying anything, and ``"member_events": true`` receives
+them. They need the privileged members intent, which has to be enabled for
+the bot in the Discord developer portal, so they are off by default; members
+are still added to the leaderboards when they use the bot. Before discord.py
+1.5 they cannot be had without presence updates, so there
+``"member_events": true`` keeps presence updates coming too.
+
+``"tracemalloc": 10`` starts tracing allocations with that many frames at
+startup for the ``memory`` command.
+"""
+
+import os
+import resource
+import tracemalloc
+from typing import Any, Dict, List, Tuple
+
+
+def client_options(config: Dict[str, Any], discord=None) -> Dict[str, Any]:
+    """Client options for ``config["memory"]``, for whichever discord.py is
+    installed: intents and member cache flags from 1.5 on, the
+    ``fetch_offline_members`` and ``guild_subscriptions`` flags before."""
+    if "memory" not in config:
+        return {}
+    if discord is None:
+        import discord
+
+    settings = config["memory"]
+    members = settings.get("members", False)
+    member_events = settings.get("member_events", False)
+    presences = settings.get("presences", False)
+    options: Dict[str, Any] = dict(
+        max_messages=settings.get("max_messages", 1000) or None
+    )
+
+    if hasattr(discord, "Intents"):
+        intents = discord.Intents.default()
+        intents.members = members or member_events
+        intents.presences = presences
+        intents.typing = presences
+        options["intents"] = intents
+        options["member_cache_flags"] = (
+            discord.MemberCacheFlags.from_intents(intents)
+            if members
+            else discord.MemberCacheFlags.none()
+        )
+        options["chunk_guilds_at_startup"] = members
+    else:
+        options["fetch_offline_members"] = members
+        options["guild_subscriptions"] = presences or member_events
+    return options
+
+
+def start_tracing(config: Dict[str, Any]):
+    frames = config.get("memory", {}).get("tracemalloc", 0)
+    if frames and not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def rss() -> int:
+    """Resident set size in bytes, or the peak where the current one is not
+    available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def top_allocations(
+    limit: int = 10, group_by: str = "lineno"
+) -> List[Tuple[str, int, int]]:
+    """``(location, size, count)`` of the largest live allocations since
+    tracing started, biggest first."""
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+    )
+    return [
+        (str(stat.traceback[0]), stat.size, stat.count)
+        for stat in snapshot.statistics(group_by)[:limit]
+    ]
+
+
+def cache_sizes(bot) -> Dict[str, int]:
+    return dict(
+        guilds=len(bot.guilds),
+        users=len(bot.users),
+        members=sum(len(guild.members) for guild in bot.guilds),
+        messages=len(bot.cached_messages),
+        known_users=len(bot.known_users),
+        leaderboard_users=len(bot.leaderboard.rankings["total"]),
+        leaderboard_guilds=len(bot.leaderboard.guilds),
+    )
+
+
+def size(count: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(count) < 1024:
+            return "{:.0f}{}".format(count, unit)
+        count /= 1024
+    return "{:.1f}GiB".format(count)
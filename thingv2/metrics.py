@@ -0,0 +1,111 @@
+import os
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Dict, List, Tuple
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Name of the command being run by the current task, used to attribute
+# database time to commands.
+current_command = ContextVar("current_command", default="")
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed bucket bounds in seconds."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target and seen:
+                return bound
+        return 0.0
+
+    def lines(self, name: str, labels: str) -> List[str]:
+        lines = []
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append('{}_bucket{{{}le="{}"}} {}'.format(name, labels, le, seen))
+        lines.append("{}_sum{{{}}} {}".format(name, labels.rstrip(","), self.sum))
+        lines.append("{}_count{{{}}} {}".format(name, labels.rstrip(","), self.count))
+        return lines
+
+
+class Metrics:
+    """Command latency, database time, HTTP time and error counts."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.commands: Dict[str, Histogram] = defaultdict(Histogram)
+        self.database: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.http: Dict[str, Histogram] = defaultdict(Histogram)
+        self.errors: Counter = Counter()
+        self.gauges: Dict[str, float] = {}
+
+    def observe_command(self, command: str, seconds: float):
+        self.commands[command].observe(seconds)
+
+    def observe_database(self, kind: str, seconds: float):
+        self.database[current_command.get() or "-", kind].observe(seconds)
+
+    def observe_http(self, route: str, seconds: float):
+        self.http[route].observe(seconds)
+
+    def error(self, command: str, error: BaseException):
+        self.errors[command, type(error).__name__] += 1
+
+    def prometheus(self) -> str:
+        lines = ["# TYPE thingv2_command_seconds histogram"]
+        for command, histogram in sorted(self.commands.items()):
+            lines += histogram.lines(
+                "thingv2_command_seconds", 'command="{}",'.format(command)
+            )
+        lines.append("# TYPE thingv2_database_seconds histogram")
+        for (command, kind), histogram in sorted(self.database.items()):
+            lines += histogram.lines(
+                "thingv2_database_seconds",
+                'command="{}",kind="{}",'.format(command, kind),
+            )
+        lines.append("# TYPE thingv2_http_seconds histogram")
+        for route, histogram in sorted(self.http.items()):
+            lines += histogram.lines(
+                "thingv2_http_seconds", 'route="{}",'.format(route)
+            )
+        lines.append("# TYPE thingv2_command_errors_total counter")
+        for (command, error), count in sorted(self.errors.items()):
+            lines.append(
+                'thingv2_command_errors_total{{command="{}",error="{}"}} {}'.format(
+                    command, error, count
+                )
+            )
+        for name, value in sorted(self.gauges.items()):
+            lines.append("# TYPE thingv2_{} gauge".format(name))
+            lines.append("thingv2_{} {}".format(name, value))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        temporary = "{}.tmp".format(path)
+        with open(temporary, "w") as f:
+            f.write(self.prometheus())
+        os.replace(temporary, path)
@@ -0,0 +1,294 @@
+"""Economy and game data split over several SQLite files.
+
+Every file has its own writer thread and its own write lock, so a burst of
+writes in one bucket no longer queues up writes in all the others. Balances
+are global, so ``users`` and ``guild_members`` rows live in the bucket of the
+user id, while ``ttt_games`` rows live in the bucket of their guild. Settings
+live in bucket 0.
+
+An existing single-file database can be split with::
+
+    python -m thingv2.partitions economy 8
+
+The number of partitions cannot be changed afterwards; split the single file
+again instead.
+"""
+
+import argparse
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from thingv2.storage import AsyncTable, Database
+
+# Table name -> (routing column, autoincrement id column)
+ROUTING = {"ttt_games": ("guild_id", "game_id")}
+
+
+def partition_url(url: str, bucket: int) -> str:
+    return "{}.{}".format(url, bucket)
+
+
+class PartitionedTable:
+    """:class:`~thingv2.storage.AsyncTable` over every bucket of a table.
+
+    Rows go to the bucket of their routing column. Ids handed out by a
+    bucket's autoincrement column are made unique across buckets as
+    ``local_id * buckets + bucket``.
+    """
+
+    def __init__(self, database: "PartitionedDatabase", name: str):
+        self.database = database
+        self.name = name
+        self.key, self.id_column = ROUTING[name]
+
+    def _table(self, bucket: int) -> AsyncTable:
+        return self.database.partitions[bucket][self.name]
+
+    def _encode(self, row: Dict[str, Any], bucket: int) -> Dict[str, Any]:
+        row = dict(row)
+        row[self.id_column] = row[self.id_column] * len(self.database) + bucket
+        return row
+
+    def _decode(self, filters: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        filters = dict(filters)
+        bucket = filters[self.id_column] % len(self.database)
+        filters[self.id_column] //= len(self.database)
+        return bucket, filters
+
+    def _by_bucket(self, filters: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+        """``filters`` for each bucket that can hold a matching row."""
+        if self.id_column not in filters:
+            return {bucket: filters for bucket in range(len(self.database))}
+        ids = filters[self.id_column]
+        if not isinstance(ids, list):
+            bucket, filters = self._decode(filters)
+            return {bucket: filters}
+
+        local: Dict[int, List[int]] = {}
+        for row_id in ids:
+            bucket, decoded = self._decode({self.id_column: row_id})
+            local.setdefault(bucket, []).append(decoded[self.id_column])
+        return {
+            bucket: dict(filters, **{self.id_column: bucket_ids})
+            for bucket, bucket_ids in local.items()
+        }
+
+    async def find(self, **filters) -> List[Dict[str, Any]]:
+        buckets = self._by_bucket(filters)
+        results = await asyncio.gather(
+            *(self._table(bucket).find(**where) for bucket, where in buckets.items())
+        )
+        return [
+            self._encode(row, bucket)
+            for bucket, rows in zip(buckets, results)
+            for row in rows
+        ]
+
+    async def find_one(self, **filters) -> Optional[Dict[str, Any]]:
+        rows = await self.find(**filters)
+        return rows[0] if rows else None
+
+    async def insert(self, row: Dict[str, Any]) -> int:
+        """Rows put back with their id keep it, and the bucket it names."""
+        if row.get(self.id_column):
+            bucket, row = self._decode(row)
+        else:
+            bucket = self.database.bucket(row[self.key])
+        local_id = await self._table(bucket).insert(row)
+        return local_id * len(self.database) + bucket
+
+    async def update(self, row: Dict[str, Any], keys: List[str]) -> int:
+        bucket, row = self._decode(row)
+        return await self._table(bucket).update(row, keys)
+
+    async def delete(self, **filters) -> bool:
+        results = await asyncio.gather(
+            *(
+                self._table(bucket).delete(**where)
+                for bucket, where in self._by_bucket(filters).items()
+            )
+        )
+        return any(results)
+
+
+class PartitionedDatabase:
+    """A set of :class:`~thingv2.storage.Database` buckets sharing one pool of
+    reader threads.
+
+    ``route(key)`` gives the bucket holding a key. ``query`` and ``execute``
+    without routing run on every bucket and concatenate their results.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        buckets: int,
+        workers: int = 4,
+        pragmas: Optional[Dict[str, Any]] = None,
+    ):
+        self.url = url
+        self._readers = ThreadPoolExecutor(workers, thread_name_prefix="db-read")
+        self.partitions = [
+            Database(
+                partition_url(url, bucket),
+                workers,
+                pragmas=pragmas,
+                readers=self._readers,
+            )
+            for bucket in range(buckets)
+        ]
+        self.pragmas = self.partitions[0].pragmas
+        self._tables: Dict[str, PartitionedTable] = {}
+
+    def __len__(self) -> int:
+        return len(self.partitions)
+
+    def __getitem__(self, name: str) -> PartitionedTable:
+        if name not in self._tables:
+            self._tables[name] = PartitionedTable(self, name)
+        return self._tables[name]
+
+    @property
+    def observer(self) -> Optional[Callable[[str, float], None]]:
+        return self.partitions[0].observer
+
+    @observer.setter
+    def observer(self, observer: Optional[Callable[[str, float], None]]):
+        for partition in self.partitions:
+            partition.observer = observer
+
+    def bucket(self, key: int) -> int:
+        return key % len(self.partitions)
+
+    def route(self, key: int) -> Database:
+        return self.partitions[self.bucket(key)]
+
+    def split(self, rows: List[Dict[str, Any]], key: str):
+        batches: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            batches.setdefault(self.bucket(row[key]), []).append(row)
+        return [(self.partitions[bucket], batch) for bucket, batch in batches.items()]
+
+    async def query(self, sql: str, **params) -> List[Dict[str, Any]]:
+        results = await asyncio.gather(
+            *(partition.query(sql, **params) for partition in self.partitions)
+        )
+        return [row for rows in results for row in rows]
+
+    async def execute(self, sql: str, **params) -> List[Dict[str, Any]]:
+        results = await asyncio.gather(
+            *(partition.execute(sql, **params) for partition in self.partitions)
+        )
+        return [row for rows in results for row in rows]
+
+    def close(self):
+        for partition in self.partitions:
+            partition.close()
+        self._readers.shutdown(wait=True)
+
+
+def open_database(url: str, config: Dict[str, Any]):
+    from thingv2.schema import PRAGMAS
+
+    pragmas = dict(PRAGMAS, **config.get("sqlite", {}))
+    workers = config.get("db_workers", 4)
+    if config.get("partitions", 1) > 1:
+        return PartitionedDatabase(url, config["partitions"], workers, pragmas)
+    return Database(url, workers=workers, pragmas=pragmas)
+
+
+# Table -> column deciding the bucket of each row, or None for bucket 0
+MIGRATE = {
+    "users": "id",
+    "guild_members": "user_id",
+    "ttt_games": "guild_id",
+    "settings": None,
+}
+# Each partition starts a ledger of its own, so the old position is dropped,
+# and the new partitions already record how many of them there are.
+MIGRATE_WHERE = {"settings": "key NOT IN ('ledger_snapshot', 'partitions')"}
+
+
+def migrate(source: str, url: str, buckets: int, batch: int = 1000) -> Dict[str, int]:
+    """Copy every table of the single file ``source`` into ``buckets`` new
+    partitions of ``url``. Games get new ids."""
+    from thingv2.backup import connect, sqlite_path
+    from thingv2.ledger import snapshot
+    from thingv2.schema import PRAGMAS, TABLES, bootstrap
+
+    # Fold any ledger entries into ``users`` first. The ledger itself is not
+    # copied; each partition starts a new one with opening entries.
+    database = Database("sqlite:///{}".format(source), pragmas=PRAGMAS)
+    try:
+        bootstrap(database)
+        database.write_sync(snapshot, database)
+    finally:
+        database.close()
+
+    database = PartitionedDatabase(url, buckets, pragmas=PRAGMAS)
+    try:
+        bootstrap(database)
+    finally:
+        database.close()
+
+    reader = connect(source)
+    targets = [connect(sqlite_path(partition_url(url, b))) for b in range(buckets)]
+    counts = {}
+    try:
+        for table, key in MIGRATE.items():
+            names = [
+                column
+                for column, declaration, _ in TABLES[table]
+                if "AUTOINCREMENT" not in declaration
+            ]
+            insert = "INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(
+                table, ", ".join(names), ", ".join("?" * len(names))
+            )
+            cursor = reader.execute(
+                "SELECT {} FROM {} WHERE {}".format(
+                    ", ".join(names), table, MIGRATE_WHERE.get(table, "1")
+                )
+            )
+            counts[table] = 0
+            while True:
+                rows = list(islice(cursor, batch))
+                if not rows:
+                    break
+                batches: Dict[int, List[sqlite3.Row]] = {}
+                for row in rows:
+                    bucket = (row[key] or 0) % buckets if key else 0
+                    batches.setdefault(bucket, []).append(tuple(row))
+                for bucket, batch_rows in batches.items():
+                    with targets[bucket]:
+                        targets[bucket].executemany(insert, batch_rows)
+                counts[table] += len(rows)
+    finally:
+        reader.close()
+        for target in targets:
+            target.close()
+    return counts
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database", help="path of the single-file database")
+    parser.add_argument("buckets", type=int)
+    parser.add_argument(
+        "--url", help="URL of the partitions, defaults to the database's own"
+    )
+    arguments = parser.parse_args(argv)
+
+    counts = migrate(
+        arguments.database,
+        arguments.url or "sqlite:///{}".format(arguments.database),
+        arguments.buckets,
+    )
+    for table, count in counts.items():
+        print("{}: {} rows".format(table, count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import json
+import sqlite3
+from typing import Any, Dict
+
+from sqlalchemy import text
+
+from thingv2.storage import Database
+
+# Upserts (INSERT ... ON CONFLICT DO UPDATE) need 3.24
+MIN_SQLITE = (3, 24)
+
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    # Wait for other processes' write locks instead of failing straight away.
+    "busy_timeout": 5000,
+}
+
+POSITIONS = json.dumps({str(i): " " for i in range(1, 10)})
+
+# (column, declaration, default used to backfill rows created before the column)
+TABLES = {
+    "users": [
+        ("id", "INTEGER PRIMARY KEY", None),
+        ("nick", "TEXT", None),
+        ("balance", "INTEGER NOT NULL DEFAULT 0", 0),
+        ("bank", "INTEGER NOT NULL DEFAULT 0", 0),
+        ("claim_cd", "INTEGER NOT NULL DEFAULT 0", 0),
+    ],
+    "ttt_games": [
+        ("game_id", "INTEGER PRIMARY KEY AUTOINCREMENT", None),
+        ("guild_id", "INTEGER", None),
+        ("crosses", "INTEGER", None),
+        ("noughts", "INTEGER", None),
+        ("message", "INTEGER", None),
+        ("turn", "TEXT NOT NULL DEFAULT 'crosses'", "crosses"),
+        ("positions", "TEXT NOT NULL DEFAULT '{}'".format(POSITIONS), POSITIONS),
+        ("crosses_mask", "INTEGER NOT NULL DEFAULT 0", 0),
+        ("noughts_mask", "INTEGER NOT NULL DEFAULT 0", 0),
+        ("channel", "INTEGER", None),
+        ("last_active", "INTEGER NOT NULL DEFAULT 0", 0),
+        ("skill", "REAL", None),
+    ],
+    "settings": [("key", "TEXT PRIMARY KEY", None), ("value", "INTEGER", None)],
+    "ledger": [
+        ("seq", "INTEGER PRIMARY KEY AUTOINCREMENT", None),
+        ("user_id", "INTEGER NOT NULL", None),
+        ("kind", "TEXT NOT NULL", None),
+        ("command", "TEXT", None),
+        ("balance", "INTEGER NOT NULL DEFAULT 0", None),
+        ("bank", "INTEGER NOT NULL DEFAULT 0", None),
+        ("claim_cd", "INTEGER", None),
+        ("at", "INTEGER NOT NULL", None),
+    ],
+    "guild_members": [
+        ("guild_id", "INTEGER NOT NULL", None),
+        ("user_id", "INTEGER NOT NULL", None),
+    ],
+}
+
+INDEXES = {
+    "ix_ttt_games_crosses": "ttt_games (crosses)",
+    "ix_ttt_games_noughts": "ttt_games (noughts)",
+    "ix_ledger_user": "ledger (user_id, seq)",
+}
+
+UNIQUE_INDEXES = {"ux_guild_members": "guild_members (guild_id, user_id)"}
+
+
+def _migrate(database: Database):
+    connection = database.db.executable
+    with database.db:
+        for table, columns in TABLES.items():
+            connection.execute(
+                text(
+                    "CREATE TABLE IF NOT EXISTS {} ({})".format(
+                        table, ", ".join("{} {}".format(*c[:2]) for c in columns)
+                    )
+                )
+            )
+            existing = {
+                row["name"]
+                for row in connection.execute(
+                    text("PRAGMA table_info({})".format(table))
+                )
+            }
+            for name, declaration, default in columns:
+                if name not in existing:
+                    connection.execute(
+                        text(
+                            "ALTER TABLE {} ADD COLUMN {} {}".format(
+                                table, name, declaration
+                            )
+                        )
+                    )
+                if default is not None:
+                    connection.execute(
+                        text(
+                            "UPDATE {0} SET {1} = :default WHERE {1} IS NULL".format(
+                                table, name
+                            )
+                        ),
+                        default=default,
+                    )
+
+        for name, target in INDEXES.items():
+            connection.execute(
+                text("CREATE INDEX IF NOT EXISTS {} ON {}".format(name, target))
+            )
+        for name, target in UNIQUE_INDEXES.items():
+            connection.execute(
+                text("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {}".format(name, target))
+            )
+
+    return {
+        name: connection.execute(text("PRAGMA {}".format(name))).scalar()
+        for name in database.pragmas
+    }
+
+
+def _record_partitions(database: Database, buckets: int) -> int:
+    connection = database.db.executable
+    with database.db:
+        connection.execute(
+            text(
+                "INSERT INTO settings (key, value) VALUES ('partitions', :buckets) "
+                "ON CONFLICT (key) DO NOTHING"
+            ),
+            buckets=buckets,
+        )
+        return connection.execute(
+            text("SELECT value FROM settings WHERE key = 'partitions'")
+        ).scalar()
+
+
+def bootstrap(database: Database) -> Dict[str, Any]:
+    """Creates or upgrades the tables and indexes in every partition, returning
+    the SQLite settings in effect on the first writer connection.
+
+    The number of partitions is kept in the first one, and opening the data
+    with a different number fails: rows and game ids are placed by it.
+    """
+    if sqlite3.sqlite_version_info < MIN_SQLITE:
+        raise RuntimeError(
+            "SQLite {} is too old, thingv2 needs {} or newer".format(
+                sqlite3.sqlite_version, ".".join(map(str, MIN_SQLITE))
+            )
+        )
+    settings = [
+        partition.write_sync(_migrate, partition) for partition in database.partitions
+    ]
+    first = database.partitions[0]
+    buckets = len(database.partitions)
+    recorded = first.write_sync(_record_partitions, first, buckets)
+    if recorded != buckets:
+        raise RuntimeError(
+            "The database was split into {} partitions, not {}. Split the single "
+            "file again with python -m thingv2.partitions to change it.".format(
+                recorded, buckets
+            )
+        )
+    return settings[0]
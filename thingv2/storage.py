@@ -0,0 +1,177 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import dataset
+from dataset import Table
+from sqlalchemy import event, text
+
+
+class AsyncTable:
+    """Awaitable wrapper around a ``dataset`` table.
+
+    Lookups run on the database's reader pool, anything that changes the table
+    runs on its single writer thread.
+    """
+
+    def __init__(self, database: "Database", name: str):
+        self.database = database
+        self.name = name
+
+    @property
+    def raw(self) -> Table:
+        return self.database.db[self.name]
+
+    async def find_one(self, *clauses, **filters) -> Optional[Dict[str, Any]]:
+        return await self.database.read(self.raw.find_one, *clauses, **filters)
+
+    async def find(self, *clauses, **filters) -> List[Dict[str, Any]]:
+        return await self.database.read(
+            lambda: list(self.raw.find(*clauses, **filters))
+        )
+
+    async def insert(self, row: Dict[str, Any]):
+        return await self.database.write(self.raw.insert, row)
+
+    async def update(self, row: Dict[str, Any], keys: List[str]) -> int:
+        return await self.database.write(self.raw.update, row, keys)
+
+    async def upsert(self, row: Dict[str, Any], keys: List[str]):
+        return await self.database.write(self.raw.upsert, row, keys)
+
+    async def delete(self, *clauses, **filters) -> bool:
+        return await self.database.write(self.raw.delete, *clauses, **filters)
+
+
+class Database:
+    """Runs ``dataset`` calls off the event loop.
+
+    Reads are spread over a bounded thread pool while every write is funnelled
+    through one dedicated thread, so SQLite only ever sees a single writer and a
+    slow fsync never blocks the gateway. ``readers`` lets several databases
+    share one reader pool.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        workers: int = 4,
+        pragmas: Optional[Dict[str, Any]] = None,
+        readers: Optional[ThreadPoolExecutor] = None,
+    ):
+        self.url = url
+        self.workers = workers
+        self.pragmas = pragmas or {}
+        self.db = dataset.connect(url)
+        event.listen(self.db.engine, "connect", self._on_connect)
+        self._owns_readers = readers is None
+        self._readers = readers or ThreadPoolExecutor(
+            workers, thread_name_prefix="db-read"
+        )
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="db-write")
+        self._tables: Dict[str, AsyncTable] = {}
+        self.observer: Optional[Callable[[str, float], None]] = None
+
+    def _on_connect(self, connection, record):
+        cursor = connection.cursor()
+        for name, value in self.pragmas.items():
+            cursor.execute("PRAGMA {} = {}".format(name, value))
+        cursor.close()
+
+    def __getitem__(self, name: str) -> AsyncTable:
+        if name not in self._tables:
+            self._tables[name] = AsyncTable(self, name)
+        return self._tables[name]
+
+    @property
+    def partitions(self) -> List["Database"]:
+        return [self]
+
+    def route(self, key: int) -> "Database":
+        """The database holding rows for ``key``; see :mod:`thingv2.partitions`."""
+        return self
+
+    def split(self, rows: List[Dict[str, Any]], key: str):
+        return [(self, rows)] if rows else []
+
+    async def _run(self, executor, kind: str, fn: Callable, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(
+                executor, functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            if self.observer:
+                self.observer(kind, time.perf_counter() - started)
+
+    async def read(self, fn: Callable, *args, **kwargs):
+        return await self._run(self._readers, "read", fn, *args, **kwargs)
+
+    async def write(self, fn: Callable, *args, **kwargs):
+        return await self._run(self._writer, "write", fn, *args, **kwargs)
+
+    def _query(self, sql: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return list(self.db.query(sql, **params))
+
+    def _execute(self, sql: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with self.db:
+            result = self.db.executable.execute(text(sql), **params)
+            if not result.returns_rows:
+                return []
+            return [dict(row) for row in result]
+
+    def _execute_many(self, sql: str, rows: List[Dict[str, Any]]):
+        with self.db:
+            self.db.executable.execute(text(sql), rows)
+
+    async def query(self, sql: str, **params) -> List[Dict[str, Any]]:
+        return await self.read(self._query, sql, params)
+
+    async def execute(self, sql: str, **params) -> List[Dict[str, Any]]:
+        return await self.write(self._execute, sql, params)
+
+    async def execute_many(self, sql: str, rows: List[Dict[str, Any]]):
+        await self.write(self._execute_many, sql, rows)
+
+    def write_sync(self, fn: Callable, *args, **kwargs):
+        return self._writer.submit(fn, *args, **kwargs).result()
+
+    def execute_many_sync(self, sql: str, rows: List[Dict[str, Any]]):
+        self.write_sync(self._execute_many, sql, rows)
+
+    def _release(self):
+        """Close the calling thread's connection, if it opened one."""
+        connection = getattr(self.db.local, "conn", None)
+        if connection is not None:
+            connection.close()
+            del self.db.local.conn
+
+    def _release_reader(self, barrier: threading.Barrier):
+        # The barrier holds every reader thread until all of them have picked
+        # up a task, so each one closes its own connection exactly once.
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        self._release()
+
+    def close(self):
+        """Close every connection on the thread that opened it, as SQLite
+        requires, then stop the threads."""
+        barrier = threading.Barrier(self.workers)
+        for future in [
+            self._readers.submit(self._release_reader, barrier)
+            for _ in range(self.workers)
+        ]:
+            future.result()
+        self.write_sync(self._release)
+        self._release()
+
+        if self._owns_readers:
+            self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        self.db.close()
@@ -0,0 +1,293 @@
+import heapq
+import json
+import random
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+FULL = 0b111111111
+
+# Bit ``n - 1`` of a mask is position ``n`` on the board:
+#   1 | 2 | 3
+#   4 | 5 | 6
+#   7 | 8 | 9
+WIN_MASKS = [
+    (0b000000111, "Rows"),
+    (0b000111000, "Rows"),
+    (0b111000000, "Rows"),
+    (0b001001001, "Columns"),
+    (0b010010010, "Columns"),
+    (0b100100100, "Columns"),
+    (0b100010001, "Diagonals"),
+    (0b001010100, "Diagonals"),
+]
+
+BOARD = (
+    "```"
+    "{0} | {1} | {2}\t\t Type !place <position> to play your turn\n"
+    "---------\t\t Get three in a row/diagonal to win.\n"
+    "{3} | {4} | {5}\t\t It is currently {9}' turn.\n"
+    "---------\n"
+    "{6} | {7} | {8}\n"
+    "```"
+)
+
+
+class Board:
+    """A Tic Tac Toe position stored as one 9-bit mask per side."""
+
+    __slots__ = ("crosses", "noughts")
+
+    def __init__(self, crosses: int = 0, noughts: int = 0):
+        self.crosses = crosses
+        self.noughts = noughts
+
+    @classmethod
+    def from_positions(cls, positions: str) -> "Board":
+        board = cls()
+        for position, symbol in json.loads(positions).items():
+            bit = 1 << (int(position) - 1)
+            if symbol == "X":
+                board.crosses |= bit
+            elif symbol == "O":
+                board.noughts |= bit
+        return board
+
+    @classmethod
+    def from_row(cls, row: Mapping) -> "Board":
+        board = cls(row["crosses_mask"] or 0, row["noughts_mask"] or 0)
+        if not board.crosses and row.get("positions"):
+            return cls.from_positions(row["positions"])
+        return board
+
+    @property
+    def turn(self) -> str:
+        if bin(self.crosses).count("1") > bin(self.noughts).count("1"):
+            return "noughts"
+        return "crosses"
+
+    def place(self, position: int) -> bool:
+        bit = 1 << (position - 1)
+        if (self.crosses | self.noughts) & bit:
+            return False
+        if self.turn == "crosses":
+            self.crosses |= bit
+        else:
+            self.noughts |= bit
+        return True
+
+    def winner(self) -> Optional[Tuple[str, str]]:
+        for mask, line in WIN_MASKS:
+            if self.crosses & mask == mask:
+                return "crosses", line
+            if self.noughts & mask == mask:
+                return "noughts", line
+        return None
+
+    def is_full(self) -> bool:
+        return self.crosses | self.noughts == FULL
+
+    def symbol(self, position: int) -> str:
+        bit = 1 << (position - 1)
+        if self.crosses & bit:
+            return "X"
+        if self.noughts & bit:
+            return "O"
+        return " "
+
+    def render(self) -> str:
+        return BOARD.format(*(self.symbol(p) for p in range(1, 10)), self.turn)
+
+    @property
+    def key(self) -> int:
+        return self.crosses | self.noughts << 9
+
+    def empty(self) -> List[int]:
+        taken = self.crosses | self.noughts
+        return [p for p in range(1, 10) if not taken & 1 << (p - 1)]
+
+
+def _solve(board: Board, moves: bytearray, scores: Dict[int, int]) -> int:
+    """Score ``board`` for the side to move, filling in ``moves`` on the way.
+
+    Wins score the number of empty squares left plus one, so the search
+    prefers quick wins and slow losses.
+    """
+    key = board.key
+    if key in scores:
+        return scores[key]
+
+    empty = board.empty()
+    if board.winner():
+        score = -(len(empty) + 1)
+    elif not empty:
+        score = 0
+    else:
+        score = -10
+        for position in empty:
+            child = Board(board.crosses, board.noughts)
+            child.place(position)
+            child_score = -_solve(child, moves, scores)
+            if child_score > score:
+                score = child_score
+                moves[key] = position
+    scores[key] = score
+    return score
+
+
+@lru_cache(maxsize=None)
+def perfect_moves() -> bytes:
+    """The best move for every reachable position, indexed by
+    :attr:`Board.key`; 0 where the game is over or the position unreachable.
+
+    Built once on first use by searching the whole game tree (5478 positions).
+    """
+    moves = bytearray(1 << 18)
+    _solve(Board(), moves, {})
+    return bytes(moves)
+
+
+# Chance of the bot playing the perfect move, by difficulty
+DIFFICULTIES = {"easy": 0.3, "normal": 0.75, "perfect": 1.0}
+
+
+def choose_move(board: Board, skill: float = 1.0, rng=random) -> int:
+    """The perfect move with probability ``skill``, otherwise a random one."""
+    if rng.random() < skill:
+        return perfect_moves()[board.key]
+    return rng.choice(board.empty())
+
+
+@dataclass()
+class Game:
+    game_id: int
+    guild_id: int
+    crosses: int
+    noughts: Optional[int] = None
+    message: Optional[int] = None
+    board: Board = field(default_factory=Board)
+    channel: Optional[int] = None
+    last_active: int = 0
+    # Set when the bot plays noughts
+    skill: Optional[float] = None
+
+    @classmethod
+    def from_row(cls, row: Mapping) -> "Game":
+        return cls(
+            row["game_id"],
+            row["guild_id"],
+            row["crosses"],
+            row["noughts"],
+            row["message"],
+            Board.from_row(row),
+            row.get("channel"),
+            row.get("last_active") or 0,
+            row.get("skill"),
+        )
+
+    def to_row(self) -> Dict[str, Any]:
+        return dict(
+            game_id=self.game_id,
+            guild_id=self.guild_id,
+            crosses=self.crosses,
+            noughts=self.noughts,
+            message=self.message,
+            channel=self.channel,
+            crosses_mask=self.board.crosses,
+            noughts_mask=self.board.noughts,
+            last_active=self.last_active,
+            skill=self.skill,
+        )
+
+    def player(self, side: str) -> Optional[int]:
+        return getattr(self, side)
+
+    @property
+    def players(self) -> List[int]:
+        """The people playing, leaving out the bot."""
+        if self.skill is not None:
+            return [self.crosses]
+        return [player for player in (self.crosses, self.noughts) if player]
+
+
+class GameIndex:
+    """In-memory lookup of running games by id and by player, plus a heap of
+    ``(last_active, game_id)`` to find the games nobody has touched in a while.
+
+    The heap is never updated in place: :meth:`touch` pushes a new entry and
+    the outdated ones are skipped when they reach the top.
+    """
+
+    def __init__(self):
+        self.by_id: Dict[int, Game] = {}
+        self.by_player: Dict[int, Game] = {}
+        self.starting: Set[int] = set()
+        self._expiry: List[Tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def load(self, rows: Iterable[Mapping], now: int = 0):
+        """Games saved before activity was tracked count as active at ``now``."""
+        self.by_id.clear()
+        self.by_player.clear()
+        self._expiry.clear()
+        for row in rows:
+            game = Game.from_row(row)
+            game.last_active = game.last_active or now
+            self.add(game)
+
+    def touch(self, game: Game, now: int):
+        game.last_active = now
+        heapq.heappush(self._expiry, (now, game.game_id))
+        if len(self._expiry) > 2 * len(self.by_id) + 64:
+            self._expiry = [(g.last_active, g.game_id) for g in self.by_id.values()]
+            heapq.heapify(self._expiry)
+
+    def expired(self, before: int) -> List[Game]:
+        """Take the games last active at or before ``before`` off the heap.
+        The caller is expected to remove them."""
+        games: Dict[int, Game] = {}
+        while self._expiry and self._expiry[0][0] <= before:
+            active, game_id = heapq.heappop(self._expiry)
+            game = self.by_id.get(game_id)
+            if game and game.last_active == active:
+                games[game_id] = game
+        return list(games.values())
+
+    def get(self, game_id: int) -> Optional[Game]:
+        return self.by_id.get(game_id)
+
+    def for_player(self, player_id: int) -> Optional[Game]:
+        return self.by_player.get(player_id)
+
+    def busy(self, player_id: int) -> bool:
+        return player_id in self.by_player or player_id in self.starting
+
+    def reserve(self, player_id: int) -> bool:
+        """Hold ``player_id`` while their new game is saved, so they cannot
+        start or join another one in the meantime. False if they are busy."""
+        if self.busy(player_id):
+            return False
+        self.starting.add(player_id)
+        return True
+
+    def release(self, player_id: int):
+        self.starting.discard(player_id)
+
+    def add(self, game: Game):
+        self.by_id[game.game_id] = game
+        heapq.heappush(self._expiry, (game.last_active, game.game_id))
+        for player in game.players:
+            self.by_player[player] = game
+            self.starting.discard(player)
+
+    def join(self, game: Game, player_id: int):
+        game.noughts = player_id
+        self.by_player[player_id] = game
+
+    def remove(self, game: Game):
+        self.by_id.pop(game.game_id, None)
+        for player in game.players:
+            if self.by_player.get(player) is game:
+                del self.by_player[player]
@@ -0,0 +1,250 @@
+import asyncio
+import glob
+import json
+import os
+from abc import ABC, abstractmethod
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
+
+from thingv2.accounts import Account, Accounts
+
+if TYPE_CHECKING:
+    from thingv2.storage import Database
+
+FLUSH_SQL = (
+    "UPDATE users SET balance = :balance, bank = :bank, claim_cd = :claim_cd "
+    "WHERE id = :id"
+)
+
+
+class CachedAccounts(Accounts, ABC):
+    """Accounts checked and changed in memory.
+
+    Subclasses decide where an account is read from in :meth:`_read` and how a
+    change is made durable in :meth:`_store`, which is awaited before the
+    command gets its answer.
+    """
+
+    def __init__(self, database: "Database"):
+        super().__init__(database)
+        self._accounts: Dict[int, Account] = {}
+
+    @abstractmethod
+    async def _store(self, user_id: int, account: Account, kind: str) -> Account:
+        pass
+
+    @abstractmethod
+    async def _read(self, user_id: int) -> Optional[Account]:
+        pass
+
+    async def _load(self, user_id: int) -> Optional[Account]:
+        if user_id not in self._accounts:
+            account = await self._read(user_id)
+            if not account:
+                return None
+            self._accounts.setdefault(user_id, account)
+        return self._accounts[user_id]
+
+    async def get(self, user_id: int) -> Optional[Account]:
+        return await self._load(user_id)
+
+    async def credit(
+        self, user_id: int, amount: int, stake: int = 0
+    ) -> Optional[Account]:
+        account = await self._load(user_id)
+        if not account or account.balance < stake:
+            return None
+        return await self._store(
+            user_id,
+            account._replace(balance=account.balance + amount),
+            "credit" if amount >= 0 else "debit",
+        )
+
+    async def deposit(self, user_id: int, amount: int) -> Optional[Account]:
+        account = await self._load(user_id)
+        if not account or account.balance < amount:
+            return None
+        return await self._store(
+            user_id,
+            account._replace(
+                balance=account.balance - amount, bank=account.bank + amount
+            ),
+            "deposit",
+        )
+
+    async def withdraw(self, user_id: int, amount: int) -> Optional[Account]:
+        account = await self._load(user_id)
+        if not account or account.bank < amount:
+            return None
+        return await self._store(
+            user_id,
+            account._replace(
+                balance=account.balance + amount, bank=account.bank - amount
+            ),
+            "withdraw",
+        )
+
+    async def claim(
+        self, user_id: int, amount: int, now: int, cooldown: int, epoch: int = 0
+    ) -> Optional[Account]:
+        account = await self._load(user_id)
+        if not account or (
+            account.claim_cd + cooldown > now and account.claim_cd >= epoch
+        ):
+            return None
+        return await self._store(
+            user_id,
+            account._replace(balance=account.balance + amount, claim_cd=now),
+            "claim",
+        )
+
+
+class WriteBehindAccounts(CachedAccounts):
+    """Accounts kept in memory and written back to ``users`` in batches.
+
+    Mutations are applied to the in-memory table straight away and appended to
+    a journal before the command gets its answer. Every ``flush_interval``
+    seconds the dirty accounts are written in one transaction and the journal
+    segments they cover are deleted. Journal lines hold whole account states,
+    so replaying them after a crash is idempotent, and each is synced to disk
+    before the command gets its answer.
+
+    At most ``cache_size`` accounts are kept; the least recently used ones
+    that have already been written back are dropped first.
+    """
+
+    def __init__(
+        self,
+        database: "Database",
+        flush_interval: float = 5,
+        journal: str = "economy.journal",
+        cache_size: int = 10000,
+    ):
+        super().__init__(database)
+        self.flush_interval = flush_interval
+        self.journal = journal
+        self.cache_size = cache_size
+        self._dirty: Set[int] = set()
+        self._in_flight: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+
+        self._recover()
+        self._segment = 0
+        self._file = open(self._segment_path(self._segment), "a")
+
+    def _segment_path(self, segment: int) -> str:
+        return "{}.{}".format(self.journal, segment)
+
+    def _segments(self) -> List[str]:
+        paths = glob.glob("{}.*".format(glob.escape(self.journal)))
+        return sorted(
+            (p for p in paths if p.rsplit(".", 1)[1].isdigit()),
+            key=lambda p: int(p.rsplit(".", 1)[1]),
+        )
+
+    def _recover(self):
+        rows = {}
+        segments = self._segments()
+        for path in segments:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        break
+                    rows[row["id"]] = row
+
+        if rows:
+            for partition, batch in self.database.split(list(rows.values()), "id"):
+                partition.execute_many_sync(FLUSH_SQL, batch)
+            print("Recovered {} accounts from the journal".format(len(rows)))
+        for path in segments:
+            os.remove(path)
+
+    def _evict(self, size: int):
+        excess = len(self._accounts) - size
+        if excess <= 0:
+            return
+        in_flight = {row["id"] for row in self._in_flight}
+        clean = (
+            user_id
+            for user_id in self._accounts
+            if user_id not in self._dirty and user_id not in in_flight
+        )
+        for user_id in list(islice(clean, excess)):
+            del self._accounts[user_id]
+
+    async def _read(self, user_id: int) -> Optional[Account]:
+        self._evict(self.cache_size - 1)
+        return await Accounts.get(self, user_id)
+
+    async def _store(self, user_id: int, account: Account, kind: str) -> Account:
+        # Re-inserted so the dict stays in least recently changed order.
+        self._accounts.pop(user_id, None)
+        self._accounts[user_id] = account
+        self._dirty.add(user_id)
+        self._file.write(json.dumps(dict(id=user_id, **account._asdict())) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if self.observer:
+            self.observer(user_id, account)
+        return account
+
+    def _take_batch(self):
+        rows = [
+            dict(id=user_id, **self._accounts[user_id]._asdict())
+            for user_id in self._dirty
+        ]
+        self._dirty = set()
+
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._segment_path(self._segment), "a")
+        return rows, self._segment
+
+    def _drop_segments(self, before: int):
+        for path in self._segments():
+            if int(path.rsplit(".", 1)[1]) < before:
+                os.remove(path)
+
+    async def flush(self):
+        if not self._dirty:
+            return
+
+        rows, segment = self._take_batch()
+        self._in_flight = rows
+        try:
+            await asyncio.gather(
+                *(
+                    partition.execute_many(FLUSH_SQL, batch)
+                    for partition, batch in self.database.split(rows, "id")
+                )
+            )
+        except Exception:
+            self._dirty.update(row["id"] for row in rows)
+            self._in_flight = []
+            raise
+        self._in_flight = []
+        self._drop_segments(segment)
+        self._evict(self.cache_size)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as error:
+                print("Write-behind flush failed:", error)
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.ensure_future(self._run())
+
+    def close(self):
+        self._dirty.update(row["id"] for row in self._in_flight)
+        if self._dirty:
+            rows, _ = self._take_batch()
+            for partition, batch in self.database.split(rows, "id"):
+                partition.execute_many_sync(FLUSH_SQL, batch)
+        self._file.close()
+        self._drop_segments(self._segment + 1)